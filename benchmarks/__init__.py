@@ -0,0 +1,2 @@
+# Бенчмарки для ExcelManager и RestaurantManager.
+# Запуск из корня репозитория, например: python -m benchmarks.startup
@@ -0,0 +1,71 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from main import ExcelManager, Product, Restaurant
+
+
+def writer(path, worker, operations, flush_every, product_id):
+    # Каждый процесс работает в режиме сессии: создаёт рестораны и меняет цену
+    # «своего» блюда в общем ресторане, периодически сбрасывая журнал в книгу
+    storage = ExcelManager(path, session=True)
+    product = Product(product_id, 1, f"Блюдо {worker}", 0.0)
+    for i in range(operations):
+        if i % 2:
+            product.price = float(i)
+            storage.save_product(product, ["price"])
+        else:
+            storage.save_restaurant(Restaurant(None, f"Ресторан {worker}-{i}", "89990000000", "ул. Тестовая"))
+        if (i + 1) % flush_every == 0:
+            storage.flush()
+    storage.close()
+
+
+def run(workers, operations, flush_every):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "restaurant_data.xlsx")
+        storage = ExcelManager(path)
+        storage.save_restaurant(Restaurant(None, "Общий", "89990000000", "ул. Общая"))
+        product_ids = [storage.save_product(Product(None, 1, f"Блюдо {w}", 0.0)).id for w in range(workers)]
+
+        start = time.perf_counter()
+        processes = [multiprocessing.Process(target=writer, args=(path, w, operations, flush_every, product_ids[w]))
+                     for w in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        # Проверка: ни одно создание и ни одно обновление не потеряно
+        restaurants = ExcelManager(path).load_restaurants_with_menus()
+        names = [r.name for r in restaurants]
+        expected = {f"Ресторан {w}-{i}" for w in range(workers) for i in range(0, operations, 2)}
+        lost_creates = len(expected - set(names))
+        duplicate_ids = len(restaurants) - len({r.id for r in restaurants})
+        last_price = float(operations - 1 if (operations - 1) % 2 else operations - 2)
+        prices = {p.id: p.price for p in restaurants[0].menu}
+        lost_updates = sum(prices.get(product_id) != last_price for product_id in product_ids)
+
+        return {"seconds": elapsed, "ops_per_second": workers * operations / elapsed,
+                "lost_creates": lost_creates, "lost_updates": lost_updates, "duplicate_ids": duplicate_ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Несколько процессов одновременно пишут в одну книгу")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--flush-every", type=int, default=50)
+    args = parser.parse_args()
+
+    result = run(args.workers, args.operations, args.flush_every)
+    print(f"процессов: {args.workers}, операций: {args.workers * args.operations}, "
+          f"{result['seconds']:.2f} с, {result['ops_per_second']:.0f} оп/с")
+    print(f"потеряно созданий: {result['lost_creates']}, потеряно обновлений: {result['lost_updates']}, "
+          f"повторных ID: {result['duplicate_ids']}")
+
+
+if __name__ == '__main__':
+    main()
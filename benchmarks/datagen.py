@@ -0,0 +1,64 @@
+import argparse
+import hashlib
+import random
+
+from openpyxl import Workbook
+
+from main import SHEET_USERS, SHEET_RESTAURANTS, SHEET_MENU
+
+STREETS = ["Ленина", "Мира", "Гагарина", "Пушкина", "Садовая", "Лесная", "Школьная", "Советская"]
+WORDS = ["Пицца", "Суши", "Бургер", "Кофе", "Гриль", "Бистро", "Дом", "Сад", "Вкус", "Уголок"]
+DISHES = ["Борщ", "Пельмени", "Салат", "Стейк", "Паста", "Ролл", "Суп", "Плов", "Блины", "Чай"]
+
+
+def random_phone(rnd):
+    # Номер всегда соответствует Restaurant.phone_pattern
+    prefix = rnd.choice(["8", "+7", ""])
+    return prefix + "".join(rnd.choice("0123456789") for _ in range(10))
+
+
+def generate_workbook(path, restaurants=100, dishes=2000, users=10, seed=0, password_hash=None):
+    # password_hash — готовый хэш пароля "admin" для всех пользователей;
+    # по умолчанию старый формат (голый sha256), который обновляется при входе
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+
+    ws = wb.create_sheet(SHEET_USERS)
+    ws.append(["ID", "Логин", "Пароль", "Роль"])
+    password_hash = password_hash or hashlib.sha256(b"admin").hexdigest()
+    ws.append([1, "admin", password_hash, "admin"])
+    for user_id in range(2, users + 1):
+        ws.append([user_id, f"user{user_id}", password_hash, "user"])
+
+    ws = wb.create_sheet(SHEET_RESTAURANTS)
+    ws.append(["ID", "Название", "Телефон", "Адрес"])
+    for restaurant_id in range(1, restaurants + 1):
+        name = f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {restaurant_id}"
+        address = f"ул. {rnd.choice(STREETS)}, {rnd.randint(1, 200)}"
+        ws.append([restaurant_id, name, random_phone(rnd), address])
+
+    ws = wb.create_sheet(SHEET_MENU)
+    ws.append(["ID", "ID_ресторана", "Название", "Цена", "Статус"])
+    for product_id in range(1, dishes + 1):
+        restaurant_id = rnd.randint(1, restaurants) if restaurants else None
+        name = f"{rnd.choice(DISHES)} {product_id}"
+        price = rnd.randint(50, 2000)
+        ws.append([product_id, restaurant_id, name, price, rnd.random() > 0.1])
+
+    wb.save(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетической книги restaurant_data.xlsx")
+    parser.add_argument("path")
+    parser.add_argument("--restaurants", type=int, default=100)
+    parser.add_argument("--dishes", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_workbook(args.path, args.restaurants, args.dishes, args.users, args.seed)
+
+
+if __name__ == '__main__':
+    main()
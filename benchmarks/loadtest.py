@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+from benchmarks.datagen import DISHES, WORDS, generate_workbook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+def next_request(rnd, restaurant_ids, product_ids, write_ratio):
+    # Смесь запросов: в основном чтения, доля записей задаётся write_ratio
+    if rnd.random() < write_ratio:
+        if rnd.random() < 0.5:
+            return "write", "PATCH", f"/products/{rnd.choice(product_ids)}", {"price": rnd.randint(50, 2000)}
+        return "write", "POST", "/restaurants", {"name": f"{rnd.choice(WORDS)} нагрузка",
+                                                 "phone": "89990000000", "address": "ул. Тестовая"}
+    kind = rnd.randrange(4)
+    if kind == 0:
+        return "list", "GET", f"/restaurants?offset={rnd.randrange(len(restaurant_ids))}&limit=20", None
+    if kind == 1:
+        return "get", "GET", f"/restaurants/{rnd.choice(restaurant_ids)}", None
+    if kind == 2:
+        return "menu", "GET", f"/restaurants/{rnd.choice(restaurant_ids)}/menu", None
+    return "search", "GET", f"/restaurants/search?q={urllib.parse.quote(rnd.choice(WORDS + DISHES))}&limit=20", None
+
+
+async def client(port, seconds, seed, restaurant_ids, product_ids, write_ratio, latencies):
+    rnd = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            kind, method, path, payload = next_request(rnd, restaurant_ids, product_ids, write_ratio)
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, method, path, payload)
+            if status >= 400:
+                raise RuntimeError(f"{method} {path}: {status}")
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load(port, connections, seconds, write_ratio):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    _, page = await request(reader, writer, "GET", "/restaurants?limit=1000000")
+    restaurant_ids = [r["id"] for r in page["items"]]
+    product_ids = []
+    for restaurant_id in restaurant_ids[:200]:
+        _, menu = await request(reader, writer, "GET", f"/restaurants/{restaurant_id}/menu?limit=1000")
+        product_ids += [p["id"] for p in menu["items"]]
+    writer.close()
+
+    latencies = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, seconds, seed, restaurant_ids, product_ids, write_ratio, latencies)
+                           for seed in range(connections)))
+    return latencies, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(restaurants, dishes, connections, seconds, write_ratio):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "restaurant_data.xlsx")
+        generate_workbook(path, restaurants, dishes)
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py"), "--xlsx", path,
+                                   "serve", "--port", "0"], stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline().rsplit(":", 1)[1])
+            latencies, elapsed = asyncio.run(load(port, connections, seconds, write_ratio))
+        finally:
+            server.terminate()
+            server.wait()
+
+    summary = {}
+    for kind, values in sorted(latencies.items()) + [("всего", sum(latencies.values(), []))]:
+        summary[kind] = {"requests": len(values), "p50_ms": percentile(values, 0.5) * 1000,
+                         "p99_ms": percentile(values, 0.99) * 1000}
+    summary["всего"]["rps"] = summary["всего"]["requests"] / elapsed
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP-сервиса (main.py serve)")
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--dishes", type=int, default=20000)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="доля запросов на запись")
+    args = parser.parse_args()
+
+    summary = run(args.restaurants, args.dishes, args.connections, args.seconds, args.write_ratio)
+    for kind, result in summary.items():
+        line = f"{kind}: {result['requests']} запросов, p50 {result['p50_ms']:.2f} мс, p99 {result['p99_ms']:.2f} мс"
+        if "rps" in result:
+            line += f", {result['rps']:.0f} запросов/с"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import tempfile
+import time
+
+from main import TABLES, ExcelManager, export_shards, parse_sheets_parallel
+from benchmarks.datagen import generate_workbook
+
+
+def serial_parse(path):
+    # Прежний путь: листы по очереди через openpyxl в режиме read_only
+    storage = ExcelManager(path)
+    return {sheet: list(storage._iter_rows(sheet)) for sheet in TABLES}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run(dishes, restaurants, workers, shards, format_):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "restaurant_data.xlsx")
+        generate_workbook(path, restaurants, dishes)
+        storage = ExcelManager(path)
+        storage.load_restaurants_with_menus()  # Выгрузка сравнивается без учёта первого разбора книги
+        results = {"serial": timed(serial_parse, path), "parse": {}, "export": {}}
+        for count in workers:
+            results["parse"][count] = timed(parse_sheets_parallel, path, tuple(TABLES), count)
+            results["export"][count] = timed(export_shards, storage, os.path.join(tmp, f"shards-{count}"),
+                                             format_, shards, count)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Разбор и выгрузка книги в один и несколько процессов")
+    parser.add_argument("--dishes", type=int, default=200000)
+    parser.add_argument("--restaurants", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", help="числа процессов (по умолчанию 1, 2, 4 ... до числа ядер)")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--format", choices=["csv", "json", "xlsx"], default="csv")
+    args = parser.parse_args()
+
+    workers = args.workers
+    if not workers:
+        workers = [1]
+        while workers[-1] * 2 <= (os.cpu_count() or 1):
+            workers.append(workers[-1] * 2)
+
+    results = run(args.dishes, args.restaurants, workers, args.shards, args.format)
+    print(f"Ядер: {os.cpu_count()}")
+    print(f"openpyxl read_only в одном процессе: {results['serial']:.2f} с")
+    for count in workers:
+        parse, export = results["parse"][count], results["export"][count]
+        print(f"процессов {count}: разбор {parse:.2f} с (x{results['serial'] / parse:.1f}), "
+              f"выгрузка {args.format} {export:.2f} с (x{results['export'][workers[0]] / export:.1f})")
+
+
+if __name__ == '__main__':
+    main()
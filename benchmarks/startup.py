@@ -0,0 +1,68 @@
+import argparse
+import os
+import tempfile
+import time
+
+from main import ExcelManager, RestaurantManager
+from benchmarks.datagen import generate_workbook
+
+
+def legacy_load(excel):
+    # Старый путь: get_products_for_restaurant на каждый ресторан (N+1 загрузок книги)
+    restaurants = excel.get_restaurants()
+    for restaurant in restaurants:
+        restaurant.menu = excel.get_products_for_restaurant(restaurant.id)
+    return restaurants
+
+
+def bench_startup(restaurants, dishes, legacy_sample=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "restaurant_data.xlsx")
+        generate_workbook(path, restaurants, dishes)
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        manager = RestaurantManager(ExcelManager(path))
+        grouped = time.perf_counter() - start
+        loaded = sum(len(r.menu) for r in manager.restaurants)
+
+        result = {
+            "restaurants": restaurants,
+            "dishes": dishes,
+            "file_bytes": size,
+            "loaded_dishes": loaded,
+            "grouped_seconds": grouped,
+        }
+
+        if legacy_sample:
+            # Полный N+1 на больших файлах занимает часы, поэтому замеряем
+            # несколько вызовов и экстраполируем на все рестораны
+            excel = ExcelManager(path)
+            sample = excel.get_restaurants()[:legacy_sample]
+            start = time.perf_counter()
+            for restaurant in sample:
+                excel.get_products_for_restaurant(restaurant.id)
+            per_call = (time.perf_counter() - start) / max(len(sample), 1)
+            result["legacy_seconds_estimate"] = per_call * restaurants
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени запуска RestaurantManager.load_data")
+    parser.add_argument("--restaurants", type=int, default=10000)
+    parser.add_argument("--dishes", type=int, default=200000)
+    parser.add_argument("--legacy-sample", type=int, default=0,
+                        help="сколько вызовов старого N+1 пути замерить для оценки")
+    args = parser.parse_args()
+
+    result = bench_startup(args.restaurants, args.dishes, args.legacy_sample)
+    print(f"Рестораны: {result['restaurants']}, блюда: {result['dishes']}, "
+          f"файл: {result['file_bytes'] / 1024 / 1024:.1f} МБ")
+    print(f"Группирующий загрузчик: {result['grouped_seconds']:.2f} с "
+          f"({result['loaded_dishes']} блюд прикреплено)")
+    if "legacy_seconds_estimate" in result:
+        print(f"Старый N+1 путь (оценка): {result['legacy_seconds_estimate']:.0f} с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import openpyxl
+
+from main import SHEET_MENU, ExcelManager, Product
+from benchmarks.datagen import generate_workbook
+
+
+def full_mode_products(path, restaurant_id):
+    # Прежний путь: книга целиком в памяти, даже если нужны только значения
+    wb = openpyxl.load_workbook(path)
+    products = []
+    for row in wb[SHEET_MENU].iter_rows(min_row=2, values_only=True):
+        if row[1] == restaurant_id:
+            products.append(Product(row[0], row[1], row[2], row[3], row[4]))
+    return products
+
+
+def streaming_products(path, restaurant_id):
+    return ExcelManager(path).get_products_for_restaurant(restaurant_id)
+
+
+def measure(mode, path):
+    # Выполняется в отдельном процессе, чтобы пиковый RSS относился только к одному режиму
+    start = time.perf_counter()
+    if mode == "before":
+        products = full_mode_products(path, 1)
+    else:
+        products = streaming_products(path, 1)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"mode": mode, "seconds": elapsed, "peak_rss_mb": peak_kb / 1024, "products": len(products)}
+
+
+def run(dishes, restaurants):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "restaurant_data.xlsx")
+        generate_workbook(path, restaurants, dishes)
+        results = []
+        for mode in ("before", "after"):
+            output = subprocess.check_output(
+                [sys.executable, "-m", "benchmarks.streaming", "--measure", mode, path])
+            results.append(json.loads(output))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пиковая память и время чтения меню: полный режим против потокового")
+    parser.add_argument("--dishes", type=int, default=500000)
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    for result in run(args.dishes, args.restaurants):
+        label = "до (полная загрузка)" if result["mode"] == "before" else "после (read_only)"
+        print(f"{label}: {result['seconds']:.2f} с, пиковый RSS {result['peak_rss_mb']:.0f} МБ, "
+              f"блюд найдено: {result['products']}")
+
+
+if __name__ == '__main__':
+    main()
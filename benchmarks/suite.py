@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from main import ExcelManager, PasswordHasher, Product, Restaurant, RestaurantManager
+from benchmarks.datagen import DISHES, STREETS, WORDS, generate_workbook, random_phone
+
+# Порог по умолчанию: замедление больше чем на 20% считается регрессией
+DEFAULT_THRESHOLD = 0.2
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def _manager(path):
+    return RestaurantManager(ExcelManager(path, session=True))
+
+
+def case_startup(path):
+    seconds, _ = _timed(_manager, path)
+    return {"seconds": seconds}
+
+
+def case_startup_snapshot(path):
+    # Повторный запуск по неизменённой книге: листы берутся из снимка, созданного первым запуском
+    _manager(path).storage.close()
+    seconds, _ = _timed(_manager, path)
+    return {"seconds": seconds}
+
+
+def case_login(path):
+    # Первый вход считает KDF, повторный попадает в кэш проверенных паролей
+    storage = ExcelManager(path, session=True)
+    cold, user = _timed(storage.verify_user, "admin", "admin")
+    assert user, "вход не удался"
+    cached, _ = _timed(storage.verify_user, "admin", "admin")
+    return {"seconds": cold, "cached_seconds": cached}
+
+
+def case_search(path, queries=200):
+    manager = _manager(path)
+    terms = WORDS + DISHES + STREETS + [word[:3] for word in WORDS] + ["пица", "сушы"]
+    seconds, _ = _timed(lambda: [manager.search_index.search(terms[i % len(terms)]) for i in range(queries)])
+    return {"seconds": seconds / queries}
+
+
+def case_edit(path, edits=200):
+    # Первая правка загружает книгу сессии в память, остальные только дописывают журнал
+    manager = _manager(path)
+    restaurant = next(r for r in manager.restaurants if r.menu)
+    product = restaurant.menu[0]
+    first, _ = _timed(manager.update_product, restaurant, product, None, product.price + 1)
+    seconds, _ = _timed(lambda: [manager.update_product(restaurant, product, None, product.price + 1)
+                                 for _ in range(edits)])
+    flush, _ = _timed(manager.storage.flush)
+    return {"seconds": seconds / edits, "first_seconds": first, "flush_seconds": flush}
+
+
+def case_cascade_delete(path):
+    manager = _manager(path)
+    restaurant = max(manager.restaurants, key=lambda r: len(r.menu))
+    manager.update_restaurant(restaurant, address=restaurant.address + " ")  # загрузка книги не в замере
+    seconds, _ = _timed(manager.remove_restaurant, restaurant)
+    flush, _ = _timed(manager.storage.flush)
+    return {"seconds": seconds, "flush_seconds": flush, "dishes": len(restaurant.menu)}
+
+
+def case_bulk_insert(path, restaurants=100, dishes_per_restaurant=10):
+    storage = ExcelManager(path, session=True)
+    batch = []
+    for i in range(restaurants):
+        restaurant = Restaurant(None, f"Новый {i}", "89990000000", "ул. Тестовая")
+        restaurant.menu = [Product(None, None, f"Блюдо {i}-{j}", 100 + j) for j in range(dishes_per_restaurant)]
+        batch.append(restaurant)
+    seconds, _ = _timed(storage.save_many, batch)
+    flush, _ = _timed(storage.flush)
+    return {"seconds": seconds + flush, "flush_seconds": flush, "rows": restaurants * (dishes_per_restaurant + 1)}
+
+
+CASES = {
+    "startup": case_startup,
+    "startup_snapshot": case_startup_snapshot,
+    "login": case_login,
+    "search": case_search,
+    "edit": case_edit,
+    "cascade_delete": case_cascade_delete,
+    "bulk_insert": case_bulk_insert,
+}
+
+
+def measure(case, template):
+    # Выполняется в отдельном процессе на своей копии книги: замеры не влияют
+    # друг на друга, а пиковый RSS относится только к одному сценарию
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "restaurant_data.xlsx")
+        shutil.copyfile(template, path)
+        result = CASES[case](path)
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def run(restaurants, dishes_per_restaurant, users, seed=0, cases=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, "template.xlsx")
+        generate_workbook(template, restaurants, restaurants * dishes_per_restaurant, users, seed,
+                          password_hash=PasswordHasher().hash("admin"))
+        results = {}
+        for case in cases or CASES:
+            output = subprocess.check_output([sys.executable, "-m", "benchmarks.suite", "--measure", case, template])
+            results[case] = json.loads(output)
+    return {
+        "meta": {"restaurants": restaurants, "dishes_per_restaurant": dishes_per_restaurant, "users": users,
+                 "seed": seed, "python": platform.python_version(), "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    # Возвращает строки (сценарий, метрика, было, стало, отношение, регрессия)
+    rows = []
+    for case, metrics in current["results"].items():
+        old_metrics = baseline["results"].get(case, {})
+        for metric in ("seconds", "peak_rss_mb"):
+            if metric in metrics and old_metrics.get(metric):
+                ratio = metrics[metric] / old_metrics[metric]
+                rows.append((case, metric, old_metrics[metric], metrics[metric], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def print_compare(rows):
+    for case, metric, old, new, ratio, regressed in rows:
+        mark = "  РЕГРЕССИЯ" if regressed else ""
+        print(f"{case:15} {metric:12} {old:12.6f} -> {new:12.6f}  x{ratio:.2f}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Набор бенчмарков ExcelManager и RestaurantManager")
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--dishes-per-restaurant", type=int, default=20)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), help="какие сценарии запускать (по умолчанию все)")
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="допустимое замедление, доля (по умолчанию 0.2)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="только сравнить два готовых файла результатов")
+    parser.add_argument("--measure", nargs=2, metavar=("CASE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        current = run(args.restaurants, args.dishes_per_restaurant, args.users, args.seed, args.cases)
+        for case, metrics in current["results"].items():
+            print(f"{case:15} " + ", ".join(f"{name} {value:.6g}" for name, value in metrics.items()))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, ensure_ascii=False, indent=2)
+        if not args.baseline:
+            return
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    rows = compare(baseline, current, args.threshold)
+    print_compare(rows)
+    if any(regressed for *_rest, regressed in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,111 @@
 import re
-import openpyxl
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
 import os
 import hashlib
+import argparse
+import asyncio
+import atexit
+import bisect
+import cProfile
+import concurrent.futures
+import csv
+import functools
+import heapq
+import hmac
+import inspect
+import json
+import marshal
+import pstats
+import queue
+import secrets
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import zipfile
+import zlib
+from array import array
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+try:
+    import fcntl
+except ImportError:  # На Windows блокировки между процессами не поддерживаются
+    fcntl = None
+
+def _openpyxl():
+    # openpyxl импортируется при первом обращении к книге: запуск со снимком обходится без него
+    import openpyxl
+    import openpyxl.utils
+    return openpyxl
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    # numpy необязателен (без него выборки MenuTable идут на чистом Python) и импортируется
+    # при первой выборке, а не при запуске программы
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
 
 # Константы для работы с Excel
 EXCEL_FILE = "restaurant_data.xlsx"
 SHEET_USERS = "Пользователи"
 SHEET_RESTAURANTS = "Рестораны"
 SHEET_MENU = "Меню"
+DB_FILE = "restaurant_data.db"
+
+# Заголовки листов и соответствующие им таблицы SQLite
+HEADERS = {
+    SHEET_USERS: ["ID", "Логин", "Пароль", "Роль"],
+    SHEET_RESTAURANTS: ["ID", "Название", "Телефон", "Адрес"],
+    SHEET_MENU: ["ID", "ID_ресторана", "Название", "Цена", "Статус"],
+}
+TABLES = {
+    SHEET_USERS: ("users", ["id", "login", "password", "role"]),
+    SHEET_RESTAURANTS: ("restaurants", ["id", "name", "phone", "address"]),
+    SHEET_MENU: ("menu", ["id", "restaurant_id", "name", "price", "status"]),
+}
+
+# Интервал автосохранения (в секундах) для режима сессии
+AUTOSAVE_INTERVAL = 30
+
+# Сколько строк списка выводить на одной странице
+PAGE_SIZE = 20
+
+# Формат снимка разобранной книги; marshal зависит от версии Python, поэтому она входит в формат
+SNAPSHOT_FORMAT = (1, sys.version_info[0], sys.version_info[1])
+
+# Переменная окружения для профилирования запуска: cpu (cProfile) или memory (tracemalloc)
+PROFILE_ENV = "RESTAURANT_PROFILE"
+
+# Сколько отрисованных списков и карточек держать в кэше
+RENDER_CACHE_SIZE = 1024
+
+# Как часто HTTP-сервис проверяет изменения других процессов (в секундах)
+SERVICE_REFRESH_INTERVAL = 1.0
+
+# История изменений: снимок каждые N записей и сколько последних снимков хранить
+HISTORY_SNAPSHOT_INTERVAL = 500
+HISTORY_SNAPSHOTS = 20
+
+# Хэширование паролей: алгоритм, стоимость и размер кэша недавних входов
+PASSWORD_ALGORITHM = "pbkdf2_sha256"
+PBKDF2_ITERATIONS = 200_000
+SCRYPT_N = 2 ** 14
+PASSWORD_CACHE_SIZE = 128
 
 
 class Product:
+    __slots__ = ("id", "restaurant_id", "name", "price", "status")
+
     def __init__(self, id_, restaurant_id, name, price, status=True):
         self.id = id_
         self.restaurant_id = restaurant_id
@@ -35,6 +128,7 @@ class Product:
 
 
 class Restaurant:
+    __slots__ = ("id", "name", "phone", "address", "menu")
     phone_pattern = r'^(8\d{10}|\+7\d{10}|\d{10})$'
 
     def __init__(self, id_, name, phone, address):
@@ -42,6 +136,7 @@ class Restaurant:
         self.name = name
         self.phone = self.phone_check(phone)
         self.address = address
+        self.menu = []
 
     def phone_check(self, phone_raw):
         if re.fullmatch(self.phone_pattern, phone_raw):
@@ -61,170 +156,2810 @@ class Restaurant:
         return f"Ресторан: {self.name}\nАдрес: {self.address}\nТелефон: {self.phone}"
 
 
-class ExcelManager:
+class ProductView:
+    # Лёгкое представление строки MenuTable с тем же API, что и Product
+    __slots__ = ("table", "position")
+
+    def __init__(self, table, position):
+        self.table = table
+        self.position = position
+
+    @property
+    def id(self):
+        return self.table.ids[self.position]
+
+    @property
+    def restaurant_id(self):
+        return self.table.restaurant_ids[self.position]
+
+    @property
+    def name(self):
+        return self.table.names[self.position]
+
+    @name.setter
+    def name(self, value):
+        self.table.names[self.position] = _intern(value)
+
+    @property
+    def price(self):
+        return self.table.prices[self.position]
+
+    @price.setter
+    def price(self, value):
+        self.table.prices[self.position] = float(value)
+
+    @property
+    def status(self):
+        return self.table.get_status(self.position)
+
+    @status.setter
+    def status(self, value):
+        self.table.set_status(self.position, value)
+
+    change_status = Product.change_status
+    update_price = Product.update_price
+    update_name = Product.update_name
+    __str__ = Product.__str__
+
+
+def _intern(name):
+    return sys.intern(name) if isinstance(name, str) else name
+
+
+class Bitmap:
+    # Битовая маска поверх bytearray: по биту на строку столбца
+    __slots__ = ("data", "size")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.size = 0
+
+    def append(self, value):
+        if self.size % 8 == 0:
+            self.data.append(0)
+        self.size += 1
+        self[self.size - 1] = value
+
+    def __getitem__(self, position):
+        return bool(self.data[position >> 3] >> (position & 7) & 1)
+
+    def __setitem__(self, position, value):
+        if value:
+            self.data[position >> 3] |= 1 << (position & 7)
+        else:
+            self.data[position >> 3] &= ~(1 << (position & 7)) & 0xFF
+
+    def array(self):
+        # Маска как массив numpy из size булевых значений
+        numpy = _numpy()
+        bits = numpy.unpackbits(numpy.frombuffer(self.data, dtype=numpy.uint8), bitorder="little")
+        return bits[:self.size].astype(bool)
+
+
+class MenuTable:
+    # Колоночный индекс меню для MenuQuery (сами блюда остаются объектами Product в
+    # restaurant.menu): ID, ID ресторанов и цены — в массивах array, статусы — битовая
+    # маска, названия интернированы. Строки доступны как ProductView. Удалённая строка
+    # помечается в маске живых строк, и её место занимает следующая добавленная.
+    # Выборки и пересчёт цен идут по столбцам через numpy, если он установлен
+    def __init__(self, products=()):
+        self.ids = array("q")
+        self.restaurant_ids = array("q")
+        self.prices = array("d")
+        self.names = []
+        self._status = Bitmap()
+        self._live = Bitmap()
+        self._free = []
+        self._sorted = True
+        self._positions = None
+        for product in products:
+            self.add(product.id, product.restaurant_id, product.name, product.price, product.status)
+
+    def __len__(self):
+        return len(self.ids) - len(self._free)
+
+    def __iter__(self):
+        return (ProductView(self, position) for position in range(len(self.ids)) if self._live[position])
+
+    def add(self, id_, restaurant_id, name, price, status=True):
+        if self._free:
+            # ID на освободившемся месте идут не по порядку: дальше поиск только по словарю
+            position = self._free.pop()
+            self._sorted = False
+            self.ids[position] = id_
+            self.restaurant_ids[position] = restaurant_id or 0
+            self.prices[position] = float(price)
+            self.names[position] = _intern(name)
+        else:
+            position = len(self.ids)
+            if self.ids and id_ <= self.ids[-1]:
+                self._sorted = False
+            self.ids.append(id_)
+            self.restaurant_ids.append(restaurant_id or 0)
+            self.prices.append(float(price))
+            self.names.append(_intern(name))
+            self._status.append(False)
+            self._live.append(False)
+        self._live[position] = True
+        self.set_status(position, status)
+        if self._positions is not None:
+            self._positions[id_] = position
+        return ProductView(self, position)
+
+    def remove(self, product_id):
+        row = self.get(product_id)
+        if row is None:
+            return False
+        self._live[row.position] = False
+        self._status[row.position] = False
+        self.names[row.position] = None
+        self._free.append(row.position)
+        if self._positions is not None:
+            del self._positions[product_id]
+        return True
+
+    def get(self, product_id):
+        # ID из листа обычно возрастают — тогда хватает бинарного поиска без словаря
+        if self._sorted:
+            position = bisect.bisect_left(self.ids, product_id)
+            found = position < len(self.ids) and self.ids[position] == product_id and self._live[position]
+            return ProductView(self, position) if found else None
+        if self._positions is None:
+            self._positions = {id_: position for position, id_ in enumerate(self.ids) if self._live[position]}
+        position = self._positions.get(product_id)
+        return ProductView(self, position) if position is not None else None
+
+    def get_status(self, position):
+        return self._status[position]
+
+    def set_status(self, position, value):
+        self._status[position] = value
+
+    def select(self, restaurant_id=None, max_price=None, available=None):
+        # Возвращает позиции живых строк, подходящих под все заданные условия
+        count = len(self.ids)
+        numpy = _numpy()
+        if numpy is not None:
+            mask = self._live.array()
+            if restaurant_id is not None:
+                mask &= numpy.frombuffer(self.restaurant_ids, dtype=numpy.int64) == restaurant_id
+            if max_price is not None:
+                mask &= numpy.frombuffer(self.prices, dtype=numpy.float64) <= max_price
+            if available is not None:
+                mask &= self._status.array() == bool(available)
+            return numpy.flatnonzero(mask).tolist()
+
+        # Без numpy первое условие проверяется по всему столбцу, остальные — только по выжившим строкам
+        positions = [i for i in range(count) if self._live[i]]
+        if restaurant_id is not None:
+            restaurant_ids = self.restaurant_ids
+            positions = [i for i in positions if restaurant_ids[i] == restaurant_id]
+        if max_price is not None:
+            prices = self.prices
+            positions = [i for i in positions if prices[i] <= max_price]
+        if available is not None:
+            positions = [i for i in positions if self._status[i] == bool(available)]
+        return positions
+
+    def available_under(self, max_price, restaurant_id=None):
+        # ID доступных блюд не дороже max_price
+        ids = self.ids
+        return [ids[position] for position in
+                self.select(restaurant_id=restaurant_id, max_price=float(max_price), available=True)]
+
+    def scale_prices(self, restaurant_id, factor):
+        # Умножает цены всех блюд ресторана на factor; возвращает ID изменённых блюд
+        positions = self.select(restaurant_id=restaurant_id)
+        numpy = _numpy()
+        if numpy is not None:
+            prices = numpy.frombuffer(self.prices, dtype=numpy.float64)
+            prices[positions] = numpy.round(prices[positions] * factor, 2)
+            # Представление держит буфер array: без него массив нельзя будет расширить
+            del prices
+        else:
+            for position in positions:
+                self.prices[position] = round(self.prices[position] * factor, 2)
+        ids = self.ids
+        return [ids[position] for position in positions]
+
+
+class Metrics:
+    # Реестр метрик процесса: для каждой операции — число вызовов, время,
+    # прочитанные строки и записанные байты
     def __init__(self):
-        self.file = EXCEL_FILE
+        self._lock = threading.Lock()
+        self.operations = {}
+        # Счётчики измеряемых сейчас блоков этого потока, внутренний — последний
+        self._local = threading.local()
+
+    def _active(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record(self, name, seconds=0.0, rows=0, written=0):
+        with self._lock:
+            stats = self.operations.get(name)
+            if stats is None:
+                stats = self.operations[name] = {"calls": 0, "seconds": 0.0, "rows": 0, "bytes": 0}
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["rows"] += rows
+            stats["bytes"] += written
+
+    @contextmanager
+    def measure(self, name):
+        # Счётчики rows и bytes заполняет сам измеряемый блок или add_rows() из кода внутри него
+        counters = {"rows": 0, "bytes": 0}
+        stack = self._active()
+        stack.append(counters)
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            stack.pop()
+            self.record(name, time.perf_counter() - start, counters["rows"], counters["bytes"])
+
+    def add_rows(self, rows):
+        # Строки, которые прочитала или изменила текущая измеряемая операция
+        stack = self._active()
+        if stack:
+            stack[-1]["rows"] += rows
+
+    def hottest(self, limit=10):
+        with self._lock:
+            items = [(name, dict(stats)) for name, stats in self.operations.items()]
+        return sorted(items, key=lambda item: item[1]["seconds"], reverse=True)[:limit]
+
+    def report(self, limit=10):
+        lines = [f"{'Операция':45} {'вызовы':>8} {'время, с':>10} {'строки':>10} {'байты':>12}"]
+        for name, stats in self.hottest(limit):
+            lines.append(f"{name:45} {stats['calls']:>8} {stats['seconds']:>10.3f} "
+                         f"{stats['rows']:>10} {stats['bytes']:>12}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self.operations.clear()
+
+
+METRICS = Metrics()
+
+
+def _instrumented(method):
+    # Учитывает вызовы, время и строки метода хранилища в METRICS. Строки обычного
+    # метода — то, что передано в METRICS.add_rows() во время вызова, включая строки
+    # вложенных операций хранилища. У генераторов время считается только внутри
+    # самого генератора, строками — выданные элементы, и они же добавляются
+    # к операции, которая генератор прочитала
+    name = method.__qualname__
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator(*args, **kwargs):
+            iterator = method(*args, **kwargs)
+            seconds, rows = 0.0, 0
+            # Строки вложенных генераторов уже учтены в выданных элементах
+            nested = {"rows": 0, "bytes": 0}
+            stack = METRICS._active()
+            try:
+                while True:
+                    start = time.perf_counter()
+                    stack.append(nested)
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        stack.pop()
+                        seconds += time.perf_counter() - start
+                    rows += 1
+                    yield item
+            finally:
+                iterator.close()
+                METRICS.record(name, seconds, rows)
+                METRICS.add_rows(rows)
+        return generator
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            with METRICS.measure(name) as counters:
+                return method(*args, **kwargs)
+        finally:
+            # Строки вложенной операции входят и во внешнюю, как и её время
+            METRICS.add_rows(counters["rows"])
+    return wrapper
+
+
+class Profiler:
+    # Необязательный сбор профиля всего запуска: "cpu" — cProfile, "memory" — tracemalloc.
+    # Включается флагом --profile или переменной окружения PROFILE_ENV
+    def __init__(self, mode, output=None):
+        if mode not in ("cpu", "memory"):
+            raise ValueError(f"Неизвестный режим профилирования: {mode}")
+        self.mode = mode
+        self.output = output
+        self._profile = None
+
+    def start(self):
+        if self.mode == "cpu":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            tracemalloc.start()
+        return self
+
+    def stop(self, stream=sys.stderr):
+        if self.mode == "cpu":
+            self._profile.disable()
+            if self.output:
+                self._profile.dump_stats(self.output)
+            pstats.Stats(self._profile, stream=stream).sort_stats("cumulative").print_stats(25)
+            return
+        snapshot = tracemalloc.take_snapshot()
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if self.output:
+            snapshot.dump(self.output)
+        print(f"Пик памяти: {peak / 1024 / 1024:.1f} МБ. Крупнейшие места выделения:", file=stream)
+        for stat in snapshot.statistics("lineno")[:15]:
+            print(f"  {stat}", file=stream)
+
+
+class SheetIndex:
+    # Индекс листа: ID → номер строки, кэш следующего ID, номер последней строки
+    # (ws.max_row обходит все ячейки листа) и, для меню, ID_ресторана → множество ID блюд
+    def __init__(self, ws, fk_col=None):
+        self.fk_col = fk_col
+        self.rows = {}
+        self.fk = {}
+        self.by_fk = {}
+        self.last_row = ws.max_row
+        max_id = 0
+        for row_number, row in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
+            if row[0]:
+                self.add(row[0], row_number, row[fk_col] if fk_col is not None else None)
+                if row[0] > max_id:
+                    max_id = row[0]
+        self.next_id = max_id + 1
+
+    def allocate_id(self):
+        new_id = self.next_id
+        self.next_id += 1
+        return new_id
+
+    def add(self, id_, row_number, fk=None):
+        self.rows[id_] = row_number
+        self.last_row = max(self.last_row, row_number)
+        if self.fk_col is not None:
+            self.fk[id_] = fk
+            self.by_fk.setdefault(fk, set()).add(id_)
+
+    def delete(self, ws, ids):
+        # Удаляет строки с указанными ID: оставшиеся строки сдвигаются вверх
+        # за один проход, затем хвост листа обрезается одним delete_rows
+        ids = list(ids)
+        drop = {self.rows[id_] for id_ in ids if id_ in self.rows}
+        if not drop:
+            return
+
+        target = min(drop)
+        last_row = self.last_row
+        with METRICS.measure("SheetIndex.delete") as counters:
+            counters["rows"] = last_row - target + 1
+            for row in ws.iter_rows(min_row=target, max_row=last_row):
+                row_number = row[0].row
+                if row_number in drop:
+                    continue
+                if row_number != target:
+                    for col, cell in enumerate(row, 1):
+                        ws.cell(target, col).value = cell.value
+                    if row[0].value in self.rows:
+                        self.rows[row[0].value] = target
+                target += 1
+            ws.delete_rows(target, last_row - target + 1)
+        METRICS.add_rows(counters["rows"])
+        self.last_row = target - 1
+
+        for id_ in ids:
+            self.rows.pop(id_, None)
+            if id_ in self.fk:
+                fk = self.fk.pop(id_)
+                self.by_fk[fk].discard(id_)
+                if not self.by_fk[fk]:
+                    del self.by_fk[fk]
+
+
+# Пространства имён частей книги .xlsx, нужные для поиска XML листов
+XLSX_NS = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+           "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships"}
+
+
+def _sheet_paths(archive):
+    # Имя листа → путь его XML внутри архива книги
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    relations = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {relation.get("Id"): relation.get("Target") for relation in relations}
+    paths = {}
+    for sheet in workbook.iterfind("m:sheets/m:sheet", XLSX_NS):
+        target = targets[sheet.get(f"{{{XLSX_NS['r']}}}id")]
+        paths[sheet.get("name")] = target[1:] if target.startswith("/") else "xl/" + target
+    return paths
+
+
+def _cell_style_count(archive):
+    # Число стилей ячеек (cellXfs) в styles.xml книги
+    try:
+        styles = ElementTree.fromstring(archive.read("xl/styles.xml"))
+    except KeyError:
+        return 0
+    cell_xfs = styles.find("m:cellXfs", XLSX_NS)
+    return len(cell_xfs) if cell_xfs is not None else 0
+
+
+def _sheet_xml(ws, original, style_count=0):
+    # XML листа по частям: разметка вокруг <sheetData> берётся из прежней версии листа,
+    # строки пишутся заново со строками inline, без общей таблицы sharedStrings.
+    # Стили ячеек сохраняются: openpyxl нумерует их в порядке cellXfs исходного
+    # styles.xml, который копируется без изменений. Стиль, которого там нет,
+    # даёт ValueError — тогда книгу нужно сохранить целиком
+    start = original.index(b"<sheetData")
+    if original.startswith(b"<sheetData/>", start):
+        end = start + len(b"<sheetData/>")
+    else:
+        end = original.index(b"</sheetData>", start) + len(b"</sheetData>")
+
+    max_row, max_col = ws.max_row, ws.max_column
+    letters = [_openpyxl().utils.get_column_letter(col) for col in range(1, max_col + 1)]
+    yield re.sub(rb'<dimension ref="[^"]*"\s*/>',
+                 f'<dimension ref="A1:{letters[-1]}{max_row}" />'.encode(), original[:start])
+
+    parts = ["<sheetData>"]
+    for row_number, row in enumerate(ws.iter_rows(), 1):
+        cells = []
+        for col, cell in enumerate(row):
+            value = cell.value
+            style = ""
+            if cell.has_style and cell.style_id:
+                if cell.style_id >= style_count:
+                    raise ValueError(f"Стиля ячейки {cell.coordinate} нет в styles.xml")
+                style = f' s="{cell.style_id}"'
+            if value is None:
+                if style:
+                    cells.append(f'<c r="{letters[col]}{row_number}"{style}/>')
+                continue
+            ref = f"{letters[col]}{row_number}"
+            if isinstance(value, bool):
+                cells.append(f'<c r="{ref}"{style} t="b"><v>{int(value)}</v></c>')
+            elif isinstance(value, (int, float)):
+                cells.append(f'<c r="{ref}"{style} t="n"><v>{value!r}</v></c>')
+            elif isinstance(value, str):
+                cells.append(f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>')
+            else:
+                raise TypeError(f"Неподдерживаемый тип ячейки {ref}: {type(value).__name__}")
+        if cells:
+            parts.append(f'<row r="{row_number}">{"".join(cells)}</row>')
+        if len(parts) >= 1000:
+            yield "".join(parts).encode("utf-8")
+            parts = []
+    parts.append("</sheetData>")
+    yield "".join(parts).encode("utf-8")
+    yield original[end:]
+
+
+def _synchronized(method):
+    # Сериализует доступ к книге между основным потоком и таймером автосохранения
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class PasswordHasher:
+    # Хэши паролей в формате "<алгоритм>$<параметры>$<соль>$<хэш>".
+    # Строки без "$" — старые несолёные SHA-256, они перехэшируются при входе
+    def __init__(self, algorithm=PASSWORD_ALGORITHM, cost=None, cache_size=PASSWORD_CACHE_SIZE):
+        if algorithm not in ("pbkdf2_sha256", "scrypt"):
+            raise ValueError(f"Неизвестный алгоритм хэширования: {algorithm}")
+        self.algorithm = algorithm
+        self.cost = cost or (PBKDF2_ITERATIONS if algorithm == "pbkdf2_sha256" else SCRYPT_N)
+        # LRU недавно проверенных паролей: ключ — сохранённый хэш, значение —
+        # быстрый HMAC пароля на секрете процесса, чтобы повторный вход не платил за KDF
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_key = secrets.token_bytes(32)
+        self._dummy = None
+
+    @staticmethod
+    def _parse(stored):
+        # (алгоритм, параметры, соль, хэш) или None, если строку не разобрать
+        try:
+            algorithm, *params, salt, digest = stored.split("$")
+            if len(params) != {"pbkdf2_sha256": 1, "scrypt": 3}[algorithm] or not all(p.isdigit() for p in params):
+                return None
+            return algorithm, params, bytes.fromhex(salt), digest
+        except (ValueError, KeyError):
+            return None
+
+    def _derive(self, algorithm, password, salt, params):
+        if algorithm == "pbkdf2_sha256":
+            return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, int(params[0]))
+        n, r, p = (int(value) for value in params)
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=128 * n * r * 2)
+
+    def hash(self, password):
+        salt = secrets.token_bytes(16)
+        params = [str(self.cost)] if self.algorithm == "pbkdf2_sha256" else [str(self.cost), "8", "1"]
+        digest = self._derive(self.algorithm, password, salt, params)
+        stored = "$".join([self.algorithm, *params, salt.hex(), digest.hex()])
+        self._remember(stored, password)
+        return stored
+
+    def _fast_digest(self, password):
+        return hmac.new(self._cache_key, password.encode(), "sha256").digest()
+
+    def verify(self, password, stored):
+        stored = str(stored or "")
+        cached = self._cache.get(stored)
+        if cached is not None and hmac.compare_digest(cached, self._fast_digest(password)):
+            self._cache.move_to_end(stored)
+            return True
+
+        if "$" not in stored:
+            expected = hashlib.sha256(password.encode()).hexdigest()
+            ok = hmac.compare_digest(expected.encode(), stored.encode())
+        else:
+            parsed = self._parse(stored)
+            if parsed is None:
+                # Испорченный хэш в хранилище — неудачный вход, а не ошибка
+                return self.verify_dummy(password)
+            algorithm, params, salt, digest = parsed
+            derived = self._derive(algorithm, password, salt, params)
+            ok = hmac.compare_digest(derived.hex().encode(), digest.encode())
+
+        if ok:
+            self._remember(stored, password)
+        return ok
+
+    def _remember(self, stored, password):
+        if self.cache_size:
+            self._cache[stored] = self._fast_digest(password)
+            self._cache.move_to_end(stored)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def verify_dummy(self, password):
+        # Для несуществующего логина тратим столько же времени, сколько на проверку
+        if self._dummy is None:
+            self._dummy = self.hash(secrets.token_hex(8))
+        algorithm, params, salt, _digest = self._parse(self._dummy)
+        self._derive(algorithm, password, salt, params)
+        return False
+
+    def needs_rehash(self, stored):
+        stored = str(stored or "")
+        parsed = self._parse(stored) if "$" in stored else None
+        if parsed is None:
+            return True
+        algorithm, params, _salt, _digest = parsed
+        return algorithm != self.algorithm or int(params[0]) != self.cost
+
+
+class StorageChanges:
+    # Изменения, сделанные другими процессами: {лист: {ID: {поле: значение} или None,
+    # если строка удалена}}. reload — изменений слишком много, нужно перечитать всё
+    def __init__(self, reload=False):
+        self.reload = reload
+        self.rows = {SHEET_RESTAURANTS: {}, SHEET_MENU: {}}
+
+    def __bool__(self):
+        return self.reload or any(self.rows.values())
+
+    def collect(self, changes):
+        for action, sheet, payload in changes:
+            if sheet not in self.rows:
+                continue
+            columns = TABLES[sheet][1]
+            rows = self.rows[sheet]
+            if action == "put":
+                rows[payload[0]] = dict(zip(columns, payload))
+            elif action == "set":
+                if rows.get(payload[0], {}) is not None:
+                    fields = rows.setdefault(payload[0], {"id": payload[0]})
+                    fields.update((columns[col], value) for col, value in payload[1])
+            elif action == "delete":
+                for id_ in payload:
+                    rows[id_] = None
+
+
+class Storage(ABC):
+    # Общий интерфейс хранилища: RestaurantManager работает только через него
+    def __init__(self, hasher=None):
+        self.hasher = hasher or PasswordHasher()
+
+    def _hash_password(self, password):
+        return self.hasher.hash(password)
+
+    def _authenticate(self, user, password):
+        # user — запись пользователя из хранилища или None, если логин не найден
+        if user is None:
+            self.hasher.verify_dummy(password)
+            return None
+        if not self.hasher.verify(password, user["password"]):
+            return None
+        if self.hasher.needs_rehash(user["password"]):
+            user["password"] = self.hasher.hash(password)
+            self._update_password(user)
+        return {"id": user["id"], "role": user["role"]}
+
+    @abstractmethod
+    def _update_password(self, user):
+        pass
+
+    @property
+    def has_unsaved_changes(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def refresh(self):
+        # Изменения, внесённые другими процессами с момента прошлого вызова
+        return StorageChanges()
+
+    @contextmanager
+    def batch(self):
+        # Групповая фиксация нескольких изменений; по умолчанию каждое фиксируется сразу
+        yield
+
+    @abstractmethod
+    def verify_user(self, username, password):
+        pass
+
+    @abstractmethod
+    def get_restaurants(self):
+        pass
+
+    @abstractmethod
+    def get_products_for_restaurant(self, restaurant_id):
+        pass
+
+    @abstractmethod
+    def iter_restaurants(self):
+        pass
+
+    @abstractmethod
+    def iter_products(self, restaurant_id=None):
+        pass
+
+    @abstractmethod
+    def load_restaurants_with_menus(self):
+        pass
+
+    # fields — имена изменённых полей; None означает «все поля»
+    @abstractmethod
+    def save_restaurant(self, restaurant, fields=None):
+        pass
+
+    @abstractmethod
+    def save_product(self, product, fields=None):
+        pass
+
+    @abstractmethod
+    def delete_restaurant(self, restaurant_id):
+        pass
+
+    @abstractmethod
+    def delete_product(self, product_id):
+        pass
+
+    def save_many(self, restaurants=(), products=()):
+        # Новые блюда из restaurant.menu получают ID ресторана после его сохранения
+        for restaurant in restaurants:
+            self.save_restaurant(restaurant)
+            for product in getattr(restaurant, "menu", []):
+                product.restaurant_id = restaurant.id
+                self.save_product(product)
+        for product in products:
+            self.save_product(product)
+
+
+class ExcelManager(Storage):
+    def __init__(self, file=EXCEL_FILE, session=False, autosave_interval=None, hasher=None, parse_workers=None):
+        super().__init__(hasher)
+        self.file = file
+        # Сколько процессов разбирают книгу при полной загрузке кусками XML
+        # (None — разбор через openpyxl, 1 — кусками в текущем процессе)
+        self.parse_workers = parse_workers
+        # Журнал изменений рядом с книгой: каждая мутация дописывается в него,
+        # а книга перезаписывается только при сжатии журнала. Журнал общий для всех
+        # процессов, работающих с книгой, и служит им лентой изменений
+        self.journal_file = file + ".journal"
+        # Снимок разобранных листов для быстрого запуска, если книга не менялась
+        self.snapshot_file = file + ".snapshot"
+        self.previous_journal_file = self.journal_file + ".prev"
+        self.lock_file = file + ".lock"
+        # В режиме сессии книга загружается один раз и держится в памяти,
+        # а на диск пишется только при flush(), по таймеру или при завершении
+        self.session = session
+        self.autosave_interval = autosave_interval
+        self._wb = None
+        self._indexed_wb = None
+        self._indexes = {}
+        self._users = None
+        self._dirty = False
+        self._timer = None
+        self._batch = None
+        self._lock = threading.RLock()
+        self._lock_fd = None
+        self._lock_depth = 0
+        # Какую версию книги и какую часть журнала этот процесс уже видел
+        self._stamp = None
+        self._generation = 0
+        self._journal_offset = 0
+        self._changes = StorageChanges()
         self._init_excel_file()
+        self._recover_journal()
+        if self.session:
+            atexit.register(self.close)
 
     def _init_excel_file(self):
         if not os.path.exists(self.file):
-            wb = Workbook()
+            wb = _openpyxl().Workbook()
 
             # Лист пользователей
             ws = wb.active
             ws.title = SHEET_USERS
-            ws.append(["ID", "Логин", "Пароль", "Роль"])
+            ws.append(HEADERS[SHEET_USERS])
 
             # Лист ресторанов
             wb.create_sheet(SHEET_RESTAURANTS)
-            wb[SHEET_RESTAURANTS].append(["ID", "Название", "Телефон", "Адрес"])
+            wb[SHEET_RESTAURANTS].append(HEADERS[SHEET_RESTAURANTS])
 
             # Лист меню
             wb.create_sheet(SHEET_MENU)
-            wb[SHEET_MENU].append(["ID", "ID_ресторана", "Название", "Цена", "Статус"])
+            wb[SHEET_MENU].append(HEADERS[SHEET_MENU])
 
             # Добавляем администратора по умолчанию
             admin_pass = self._hash_password("admin")
             ws.append([1, "admin", admin_pass, "admin"])
 
-            wb.save(self.file)
+            with self._file_lock():
+                if not os.path.exists(self.file):
+                    self._write_atomic(wb)
+
+    @contextmanager
+    def _file_lock(self):
+        # Рекомендательная блокировка (fcntl.flock) между процессами, работающими
+        # с одной книгой. Повторный захват в том же процессе файл не перезахватывает
+        with self._lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                if self._lock_fd is None:
+                    self._lock_fd = open(self.lock_file, "a")
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _file_stamp(self):
+        stat = os.stat(self.file)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_journal(self, offset=0, journal_file=None):
+        # Возвращает записи после offset как пары (конец записи, запись).
+        # Первой записью журнала может быть маркер сжатия — словарь
+        entries = []
+        try:
+            journal = open(journal_file or self.journal_file, "rb")
+        except FileNotFoundError:
+            return entries
+        with journal:
+            journal.seek(offset)
+            for line in journal:
+                if not line.endswith(b"\n"):
+                    break  # Оборванная последняя запись: сбой случился во время дозаписи
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                offset += len(line)
+                entries.append((offset, record))
+        return entries
+
+    def _recover_journal(self):
+        # Незавершённые изменения (после сбоя или от других процессов) накатываются
+        # на книгу при запуске
+        with self._file_lock():
+            self._stamp = self._file_stamp()
+            entries = self._read_journal()
+            self._generation = self._journal_marker(entries).get("generation", 0)
+            if any(not isinstance(record, dict) for _end, record in entries):
+                self._compact(self._load_workbook())
+            else:
+                self._journal_offset = entries[-1][0] if entries else 0
+
+    @staticmethod
+    def _journal_marker(entries):
+        return entries[0][1] if entries and isinstance(entries[0][1], dict) else {}
+
+    @_instrumented
+    def _sync(self):
+        # Подтягивает изменения других процессов; вызывается под файловой блокировкой.
+        # Обычно это чтение хвоста журнала после своего смещения. Если книгу
+        # пересохранили, непрочитанный хвост берётся из предыдущего поколения журнала
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._dirty = False
+            entries = self._read_journal()
+            marker = self._journal_marker(entries)
+            if (marker.get("generation") == self._generation + 1
+                    and self._journal_offset <= marker.get("compacted", -1)
+                    and os.path.exists(self.previous_journal_file)):
+                self._consume(self._read_journal(self._journal_offset, self.previous_journal_file))
+                self._generation += 1
+                self._journal_offset = 0
+            else:
+                # Пропущено больше одного сжатия: перечитываем данные целиком
+                self._wb = None
+                self._users = None
+                self._changes.reload = True
+                self._generation = marker.get("generation", 0)
+                self._journal_offset = entries[-1][0] if entries else 0
+                return
 
-    def _hash_password(self, password):
-        return hashlib.sha256(password.encode()).hexdigest()
+        self._consume(self._read_journal(self._journal_offset))
+
+    def _consume(self, entries):
+        for end, record in entries:
+            self._journal_offset = end
+            if isinstance(record, dict):
+                continue
+            if self._wb is not None:
+                self._apply(self._wb, record)
+            if any(sheet == SHEET_USERS for _action, sheet, _payload in record):
+                self._users = None
+            self._changes.collect(record)
+
+    def _journal_pending(self):
+        return any(not isinstance(record, dict) for _end, record in self._read_journal())
+
+    def _load_workbook(self):
+        # Книга с применённым журналом; вызывается под файловой блокировкой
+        if self.session and self._wb is not None:
+            return self._wb
+        with METRICS.measure("openpyxl.load_workbook"):
+            wb = _openpyxl().load_workbook(self.file)
+        for _end, record in self._read_journal():
+            if not isinstance(record, dict):
+                self._apply(wb, record)
+        if self.session:
+            self._wb = wb
+        return wb
+
+    def _writable_workbook(self):
+        self._sync()
+        return self._load_workbook()
+
+    def _index(self, wb, sheet):
+        # Индексы строятся одним проходом при первом обращении к листу книги
+        # и дальше поддерживаются при изменениях
+        if self._indexed_wb is not wb:
+            self._indexed_wb = wb
+            self._indexes = {}
+        if sheet not in self._indexes:
+            with METRICS.measure("SheetIndex.build") as counters:
+                self._indexes[sheet] = SheetIndex(wb[sheet], 1 if sheet == SHEET_MENU else None)
+                counters["rows"] = len(self._indexes[sheet].rows)
+            METRICS.add_rows(counters["rows"])
+        return self._indexes[sheet]
+
+    def _apply(self, wb, changes):
+        # Изменение — список операций: ("put", лист, строка) — вставка или замена
+        # строки целиком, ("set", лист, [ID, [[столбец, значение], ...]]) — изменение
+        # отдельных полей существующей строки, ("delete", лист, [ID]).
+        # Все операции идемпотентны, поэтому повторное применение журнала безопасно
+        for action, sheet, payload in changes:
+            ws = wb[sheet]
+            index = self._index(wb, sheet)
+            # Сдвинутые при удалении строки учитывает SheetIndex.delete
+            if action in ("put", "set"):
+                METRICS.add_rows(1)
+            if action == "put":
+                row_number = index.rows.get(payload[0])
+                if row_number:
+                    for col, value in enumerate(payload[1:], 2):
+                        ws.cell(row_number, col).value = value
+                else:
+                    row_number = index.last_row + 1
+                    for col, value in enumerate(payload, 1):
+                        ws.cell(row_number, col).value = value
+                    index.add(payload[0], row_number, payload[index.fk_col] if index.fk_col is not None else None)
+                    index.next_id = max(index.next_id, payload[0] + 1)
+            elif action == "set":
+                row_number = index.rows.get(payload[0])
+                if row_number:
+                    for col, value in payload[1]:
+                        ws.cell(row_number, col + 1).value = value
+            elif action == "delete":
+                index.delete(ws, payload)
+
+    @staticmethod
+    def _row(sheet, entity):
+        return [getattr(entity, field) for field in TABLES[sheet][1]]
+
+    @staticmethod
+    def _set_fields(sheet, entity, fields=None):
+        # Пишутся только изменённые поля, чтобы не затирать правки других процессов
+        columns = TABLES[sheet][1]
+        values = [[col, getattr(entity, field)] for col, field in enumerate(columns)
+                  if col > 0 and (fields is None or field in fields)]
+        return [entity.id, values]
+
+    def _commit(self, wb, changes):
+        # Вызывается под файловой блокировкой после _sync()
+        self._apply(wb, changes)
+        if not self.session:
+            self._compact(wb, {sheet for _action, sheet, _payload in changes})
+            return
+        if self._batch is not None:
+            self._batch.append(changes)
+        else:
+            self._append_journal([changes])
+        self._dirty = True
+        self._schedule_autosave()
+
+    @contextmanager
+    def batch(self):
+        # Групповая фиксация в режиме сессии: файловая блокировка держится весь пакет,
+        # а записи журнала дописываются в конце одним fsync
+        with self._lock, self._file_lock():
+            if self._batch is not None or not self.session:
+                yield
+                return
+            self._batch = []
+            try:
+                yield
+            finally:
+                records, self._batch = self._batch, None
+                if records:
+                    self._append_journal(records)
+
+    def _append_journal(self, records):
+        data = b"".join(json.dumps(changes, ensure_ascii=False).encode("utf-8") + b"\n" for changes in records)
+        with METRICS.measure("ExcelManager._append_journal") as counters, open(self.journal_file, "ab") as journal:
+            journal.write(data)
+            journal.flush()
+            os.fsync(journal.fileno())
+            self._journal_offset = journal.tell()
+            counters["rows"] = len(records)
+            counters["bytes"] = len(data)
+
+    def _write_atomic(self, wb, sheets=None):
+        # Книга пишется во временный файл и подменяет исходную одним rename,
+        # так что сбой во время сохранения не портит единственную копию данных.
+        # Если известны изменённые листы, пересобираются только их XML
+        tmp_file = self.file + ".tmp"
+        if sheets is None or not self._write_sheets(wb, sheets, tmp_file):
+            with METRICS.measure("openpyxl.save") as counters:
+                wb.save(tmp_file)
+                counters["bytes"] = os.path.getsize(tmp_file)
+        with open(tmp_file, "rb") as tmp:
+            os.fsync(tmp.fileno())
+        os.replace(tmp_file, self.file)
+
+    def _write_sheets(self, wb, sheets, tmp_file):
+        # Копия текущего файла книги, в которой заменены только XML изменённых листов;
+        # остальные части архива переносятся без изменений. False — если книгу
+        # так обновить нельзя и нужно полное сохранение
+        try:
+            with METRICS.measure("xlsx.write_sheets") as counters, zipfile.ZipFile(self.file) as source:
+                paths = _sheet_paths(source)
+                style_count = _cell_style_count(source)
+                replaced = {paths[sheet]: sheet for sheet in sheets}
+                with zipfile.ZipFile(tmp_file, "w", zipfile.ZIP_DEFLATED) as target:
+                    for info in source.infolist():
+                        data = source.read(info)
+                        if info.filename not in replaced:
+                            target.writestr(info, data)
+                            continue
+                        with target.open(info, "w") as part:
+                            for chunk in _sheet_xml(wb[replaced[info.filename]], data, style_count):
+                                part.write(chunk)
+                counters["bytes"] = os.path.getsize(tmp_file)
+            return True
+        except (OSError, KeyError, ValueError, TypeError, zipfile.BadZipFile, ElementTree.ParseError):
+            return False
 
+    @_instrumented
+    def _compact(self, wb, sheets=()):
+        # Сжатие журнала: книга с применённым журналом атомарно записывается на диск,
+        # прежний журнал остаётся рядом как предыдущее поколение, а новый начинается
+        # с маркера. Процесс, не дочитавший прежний журнал, дочитает его из .prev
+        entries = self._read_journal()
+        generation = self._journal_marker(entries).get("generation", 0) + 1
+        journal_size = entries[-1][0] if entries else 0
+        # Переписываются только листы, затронутые записями журнала и текущим изменением
+        records = [record for _end, record in entries if not isinstance(record, dict)] + (self._batch or [])
+        dirty = set(sheets) | {sheet for record in records for _action, sheet, _payload in record}
+        self._write_atomic(wb, dirty)
+        if os.path.exists(self.journal_file):
+            os.replace(self.journal_file, self.previous_journal_file)
+        self._reset_journal(generation, journal_size)
+
+    def _reset_journal(self, generation, compacted):
+        # Новый журнал из одного маркера сжатия; вызывается под файловой блокировкой
+        marker = json.dumps({"generation": generation, "compacted": compacted}).encode() + b"\n"
+        tmp_file = self.journal_file + ".tmp"
+        with open(tmp_file, "wb") as journal:
+            journal.write(marker)
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(tmp_file, self.journal_file)
+        self._stamp = self._file_stamp()
+        self._generation = generation
+        self._journal_offset = len(marker)
+        self._dirty = False
+
+    @_synchronized
+    def replace_all(self, sheets):
+        # Заменяет содержимое книги строками sheets ({лист: строки без заголовка}).
+        # Журнал сбрасывается маркером без прежнего размера, поэтому другие процессы
+        # не дочитывают старый журнал, а перечитывают книгу целиком
+        with self._file_lock():
+            wb = _openpyxl().Workbook(write_only=True)
+            for sheet in (SHEET_USERS, SHEET_RESTAURANTS, SHEET_MENU):
+                ws = wb.create_sheet(sheet)
+                ws.append(HEADERS[sheet])
+                for row in sheets.get(sheet, ()):
+                    ws.append(list(row))
+            generation = self._journal_marker(self._read_journal()).get("generation", 0) + 1
+            self._write_atomic(wb)
+            self._reset_journal(generation, -1)
+            self._wb = None
+            self._indexed_wb = None
+            self._indexes = {}
+            self._users = None
+
+    def _schedule_autosave(self):
+        if self.autosave_interval and self._timer is None:
+            self._timer = threading.Timer(self.autosave_interval, self._autosave)
+            self._timer.daemon = True
+            self._timer.start()
+
+    @_synchronized
+    def _autosave(self):
+        self._timer = None
+        self.flush()
+
+    @property
+    def has_unsaved_changes(self):
+        return self._dirty
+
+    @_instrumented
+    @_synchronized
+    def flush(self):
+        if self._wb is None or not self._dirty:
+            return
+        with self._file_lock():
+            self._sync()
+            # Свои записи уже могли попасть в книгу при сжатии другим процессом
+            if self._dirty:
+                self._compact(self._load_workbook())
+
+    @_synchronized
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.flush()
+        if self._wb is not None:
+            try:
+                self._save_snapshot()
+            except OSError:
+                pass  # Снимок только ускоряет запуск; без него книга просто разберётся заново
+
+    @_instrumented
+    @_synchronized
+    def refresh(self):
+        with self._file_lock():
+            self._sync()
+        changes, self._changes = self._changes, StorageChanges()
+        return changes
+
+    def _snapshot_key(self):
+        # Снимок действителен для книги с теми же mtime, размером и содержимым
+        stat = os.stat(self.file)
+        digest = hashlib.blake2b()
+        with open(self.file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return stat.st_mtime_ns, stat.st_size, digest.hexdigest()
+
+    def _read_snapshot(self):
+        # Листы из снимка или None, если снимка нет, он устарел или в журнале
+        # есть изменения, которых ещё нет в файле книги
+        if self._wb is not None or self._journal_pending():
+            return None
+        try:
+            with open(self.snapshot_file, "rb") as f:
+                snapshot = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+            return None
+        if snapshot.get("key") != self._snapshot_key():
+            return None
+        return snapshot["sheets"]
+
+    def _write_snapshot(self, key, sheets):
+        tmp_file = self.snapshot_file + ".tmp"
+        with METRICS.measure("ExcelManager._write_snapshot") as counters:
+            with open(tmp_file, "wb") as f:
+                marshal.dump({"format": SNAPSHOT_FORMAT, "key": key, "sheets": sheets}, f)
+            counters["bytes"] = os.path.getsize(tmp_file)
+        os.replace(tmp_file, self.snapshot_file)
+
+    def _save_snapshot(self):
+        # Снимок из книги сессии: после сжатия она совпадает с файлом, и повторно
+        # разбирать XML для следующего запуска не нужно
+        with self._file_lock():
+            self._sync()
+            if self._wb is None or self._dirty or self._journal_pending():
+                return
+            key = self._snapshot_key()
+            try:
+                with open(self.snapshot_file, "rb") as f:
+                    if marshal.load(f).get("key") == key:
+                        return
+            except (OSError, EOFError, ValueError, TypeError, AttributeError):
+                pass
+            self._write_snapshot(key, {sheet: list(self._wb[sheet].iter_rows(min_row=2, values_only=True))
+                                       for sheet in TABLES})
+
+    def load_sheets(self, refresh=False):
+        # Все листы целиком с применённым журналом: {лист: строки без заголовка}.
+        # Из снимка, если он соответствует книге, иначе разбором файла с записью нового
+        # снимка. refresh — разобрать файл заново, не заглядывая в снимок
+        if not refresh:
+            with METRICS.measure("ExcelManager._read_snapshot") as counters:
+                sheets = self._read_snapshot()
+                counters["rows"] = sum(len(rows) for rows in sheets.values()) if sheets else 0
+            if sheets is not None:
+                METRICS.add_rows(counters["rows"])
+                return sheets
+        with self._file_lock():
+            key = None if self._wb is not None or self._journal_pending() else self._snapshot_key()
+            sheets = None
+            if key is not None and self.parse_workers:
+                try:
+                    with METRICS.measure("parse_sheets_parallel") as counters:
+                        sheets = parse_sheets_parallel(self.file, tuple(TABLES), self.parse_workers)
+                        counters["rows"] = sum(len(rows) for rows in sheets.values())
+                    METRICS.add_rows(counters["rows"])
+                except (ValueError, KeyError, ElementTree.ParseError):
+                    # Книгу, которую не разобрать кусками, читает openpyxl; в снимок
+                    # попадает только результат успешного разбора
+                    sheets = None
+            if sheets is None:
+                sheets = {sheet: list(self._iter_rows(sheet)) for sheet in TABLES}
+            if key is not None:
+                self._write_snapshot(key, sheets)
+        return sheets
+
+    @staticmethod
+    def _user_index(rows):
+        users = {}
+        for row in rows:
+            if row[0] and row[1] not in users:
+                users[row[1]] = {"id": row[0], "login": row[1], "password": row[2], "role": row[3]}
+        return users
+
+    def _get_users(self):
+        # Лист пользователей читается один раз в словарь логин → запись
+        if self._users is None:
+            self._users = self._user_index(self._iter_rows(SHEET_USERS))
+        return self._users
+
+    def _update_password(self, user):
+        with self._file_lock():
+            wb = self._writable_workbook()
+            columns = TABLES[SHEET_USERS][1]
+            self._commit(wb, [("set", SHEET_USERS, [user["id"], [[columns.index("password"), user["password"]]]])])
+
+    @_instrumented
+    @_synchronized
     def verify_user(self, username, password):
-        wb = openpyxl.load_workbook(self.file)
-        ws = wb[SHEET_USERS]
-
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[1] == username and row[2] == self._hash_password(password):
-                return {"id": row[0], "role": row[3]}
-        return None
+        user = self._get_users().get(username)
+        METRICS.add_rows(int(user is not None))
+        return self._authenticate(user, password)
+
+    @_instrumented
+    def _iter_rows(self, sheet):
+        # Строки листа читаются по одной из книги в режиме read_only, так что
+        # память не зависит от размера листа. Если в журнале есть ещё не сжатые
+        # записи, читается книга с применённым журналом. Книга сессии уже в памяти —
+        # её строки копируются под блокировкой, чтобы не конфликтовать с записью
+        with self._lock:
+            wb = self._wb
+            if wb is None and self._journal_pending():
+                with self._file_lock():
+                    wb = self._load_workbook()
+            if wb is not None:
+                rows = list(wb[sheet].iter_rows(min_row=2, values_only=True))
+        if wb is not None:
+            yield from rows
+            return
 
-    def get_restaurants(self):
-        wb = openpyxl.load_workbook(self.file)
-        ws = wb[SHEET_RESTAURANTS]
+        with METRICS.measure("openpyxl.load_workbook(read_only)"):
+            wb = _openpyxl().load_workbook(self.file, read_only=True)
+        try:
+            yield from wb[sheet].iter_rows(min_row=2, values_only=True)
+        finally:
+            wb.close()
 
-        restaurants = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
+    @_instrumented
+    def iter_restaurants(self):
+        for row in self._iter_rows(SHEET_RESTAURANTS):
             if row[0]:  # Проверяем, что ID не пустой
-                restaurants.append(Restaurant(row[0], row[1], row[2], row[3]))
-        return restaurants
+                yield Restaurant(row[0], row[1], row[2], row[3])
+
+    @_instrumented
+    def iter_products(self, restaurant_id=None):
+        for row in self._iter_rows(SHEET_MENU):
+            if row[0] and (restaurant_id is None or row[1] == restaurant_id):
+                yield Product(row[0], row[1], row[2], row[3], row[4])
 
+    @_instrumented
+    def get_restaurants(self):
+        return list(self.iter_restaurants())
+
+    @_instrumented
+    @_synchronized
     def get_products_for_restaurant(self, restaurant_id):
-        wb = openpyxl.load_workbook(self.file)
-        ws = wb[SHEET_MENU]
+        if self._wb is None:
+            return list(self.iter_products(restaurant_id))
 
+        # Книга сессии уже загружена: строки блюд берутся по индексу
+        ws = self._wb[SHEET_MENU]
+        index = self._index(self._wb, SHEET_MENU)
         products = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[1] == restaurant_id:
-                products.append(Product(row[0], row[1], row[2], row[3], row[4]))
+        for row_number in sorted(index.rows[product_id] for product_id in index.by_fk.get(restaurant_id, ())):
+            row = [cell.value for cell in ws[row_number]]
+            products.append(Product(row[0], row[1], row[2], row[3], row[4]))
+        METRICS.add_rows(len(products))
         return products
 
-    def save_restaurant(self, restaurant):
-        wb = openpyxl.load_workbook(self.file)
-        ws = wb[SHEET_RESTAURANTS]
+    @_instrumented
+    @_synchronized
+    def load_restaurants_with_menus(self):
+        # Рестораны и меню читаются за один проход по каждому листу (или из снимка):
+        # блюда группируются по ID_ресторана и прикрепляются к ресторанам.
+        # Пользователи из того же прохода сразу попадают в кэш для входа
+        sheets = self.load_sheets()
+        if self._users is None:
+            self._users = self._user_index(sheets[SHEET_USERS])
+
+        menus = {}
+        for row in sheets[SHEET_MENU]:
+            if row[0]:
+                menus.setdefault(row[1], []).append(Product(row[0], row[1], row[2], row[3], row[4]))
 
-        # Находим максимальный ID
-        max_id = 0
-        for row in ws.iter_rows(min_row=2, max_col=1, values_only=True):
-            if row[0] and row[0] > max_id:
-                max_id = row[0]
-
-        # Если это новый ресторан (без ID)
-        if not hasattr(restaurant, 'id') or not restaurant.id:
-            restaurant.id = max_id + 1
-            ws.append([restaurant.id, restaurant.name, restaurant.phone, restaurant.address])
-        else:
-            # Обновляем существующий ресторан
-            for row in ws.iter_rows(min_row=2):
-                if row[0].value == restaurant.id:
-                    row[1].value = restaurant.name
-                    row[2].value = restaurant.phone
-                    row[3].value = restaurant.address
-                    break
+        restaurants = []
+        for row in sheets[SHEET_RESTAURANTS]:
+            if row[0]:
+                restaurant = Restaurant(row[0], row[1], row[2], row[3])
+                restaurant.menu = menus.get(restaurant.id, [])
+                restaurants.append(restaurant)
+        return restaurants
 
-        wb.save(self.file)
+    @_instrumented
+    @_synchronized
+    def save_restaurant(self, restaurant, fields=None):
+        with self._file_lock():
+            wb = self._writable_workbook()
+
+            # Если это новый ресторан (без ID)
+            if not hasattr(restaurant, 'id') or not restaurant.id:
+                restaurant.id = self._index(wb, SHEET_RESTAURANTS).allocate_id()
+                change = ("put", SHEET_RESTAURANTS, self._row(SHEET_RESTAURANTS, restaurant))
+            else:
+                change = ("set", SHEET_RESTAURANTS, self._set_fields(SHEET_RESTAURANTS, restaurant, fields))
+
+            self._commit(wb, [change])
         return restaurant
 
-    def save_product(self, product):
-        wb = openpyxl.load_workbook(self.file)
-        ws = wb[SHEET_MENU]
+    @_instrumented
+    @_synchronized
+    def save_product(self, product, fields=None):
+        with self._file_lock():
+            wb = self._writable_workbook()
 
-        # Находим максимальный ID
-        max_id = 0
-        for row in ws.iter_rows(min_row=2, max_col=1, values_only=True):
-            if row[0] and row[0] > max_id:
-                max_id = row[0]
-
-        # Если это новое блюдо (без ID)
-        if not hasattr(product, 'id') or not product.id:
-            product.id = max_id + 1
-            ws.append([product.id, product.restaurant_id, product.name, product.price, product.status])
-        else:
-            # Обновляем существующее блюдо
-            for row in ws.iter_rows(min_row=2):
-                if row[0].value == product.id:
-                    row[2].value = product.name
-                    row[3].value = product.price
-                    row[4].value = product.status
-                    break
+            # Если это новое блюдо (без ID)
+            if not hasattr(product, 'id') or not product.id:
+                product.id = self._index(wb, SHEET_MENU).allocate_id()
+                change = ("put", SHEET_MENU, self._row(SHEET_MENU, product))
+            else:
+                change = ("set", SHEET_MENU, self._set_fields(SHEET_MENU, product, fields))
 
-        wb.save(self.file)
+            self._commit(wb, [change])
         return product
 
+    @_instrumented
+    @_synchronized
     def delete_restaurant(self, restaurant_id):
-        wb = openpyxl.load_workbook(self.file)
+        with self._file_lock():
+            wb = self._writable_workbook()
 
-        # Удаляем ресторан
-        ws = wb[SHEET_RESTAURANTS]
-        for row in ws.iter_rows(min_row=2):
-            if row[0].value == restaurant_id:
-                ws.delete_rows(row[0].row)
-                break
+            # Удаляем ресторан вместе с его блюдами одной записью журнала
+            product_ids = sorted(self._index(wb, SHEET_MENU).by_fk.get(restaurant_id, ()))
+            self._commit(wb, [("delete", SHEET_RESTAURANTS, [restaurant_id]),
+                              ("delete", SHEET_MENU, product_ids)])
+
+    @_instrumented
+    @_synchronized
+    def delete_product(self, product_id):
+        with self._file_lock():
+            wb = self._writable_workbook()
+            self._commit(wb, [("delete", SHEET_MENU, [product_id])])
+
+    @_instrumented
+    @_synchronized
+    def save_many(self, restaurants=(), products=()):
+        # Все строки пакета назначаются и записываются одним изменением
+        with self._file_lock():
+            wb = self._writable_workbook()
+            restaurant_index = self._index(wb, SHEET_RESTAURANTS)
+            menu_index = self._index(wb, SHEET_MENU)
+
+            changes = []
+            all_products = list(products)
+            for restaurant in restaurants:
+                if not restaurant.id:
+                    restaurant.id = restaurant_index.allocate_id()
+                changes.append(("put", SHEET_RESTAURANTS, self._row(SHEET_RESTAURANTS, restaurant)))
+                for product in getattr(restaurant, "menu", []):
+                    product.restaurant_id = restaurant.id
+                    all_products.append(product)
+            for product in all_products:
+                if not product.id:
+                    product.id = menu_index.allocate_id()
+                changes.append(("put", SHEET_MENU, self._row(SHEET_MENU, product)))
+
+            self._commit(wb, changes)
+
+
+class SQLiteManager(Storage):
+    def __init__(self, file=DB_FILE, hasher=None):
+        super().__init__(hasher)
+        self.file = file
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.file, check_same_thread=False)
+        self._init_db()
+        self._data_version = self._current_data_version()
+
+    def _init_db(self):
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY,
+                    login TEXT NOT NULL UNIQUE,
+                    password TEXT NOT NULL,
+                    role TEXT
+                );
+                CREATE TABLE IF NOT EXISTS restaurants (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    phone TEXT,
+                    address TEXT
+                );
+                CREATE TABLE IF NOT EXISTS menu (
+                    id INTEGER PRIMARY KEY,
+                    restaurant_id INTEGER REFERENCES restaurants(id) ON DELETE CASCADE,
+                    name TEXT,
+                    price REAL,
+                    status INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS menu_restaurant_id ON menu(restaurant_id);
+            """)
+            # Добавляем администратора по умолчанию
+            if self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+                self.conn.execute("INSERT INTO users (id, login, password, role) VALUES (1, 'admin', ?, 'admin')",
+                                  (self._hash_password("admin"),))
+
+    @_synchronized
+    def close(self):
+        self.conn.close()
+
+    def _current_data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @_instrumented
+    @_synchronized
+    def refresh(self):
+        # data_version меняется только после фиксаций из других соединений,
+        # поэтому проверка стоит одного запроса без чтения таблиц
+        version = self._current_data_version()
+        changed = version != self._data_version
+        self._data_version = version
+        return StorageChanges(reload=changed)
+
+    def _update_password(self, user):
+        with self.conn:
+            self.conn.execute("UPDATE users SET password = ? WHERE id = ?", (user["password"], user["id"]))
+
+    @_instrumented
+    @_synchronized
+    def verify_user(self, username, password):
+        row = self.conn.execute("SELECT id, login, password, role FROM users WHERE login = ?", (username,)).fetchone()
+        user = {"id": row[0], "login": row[1], "password": row[2], "role": row[3]} if row else None
+        METRICS.add_rows(int(user is not None))
+        return self._authenticate(user, password)
+
+    @_instrumented
+    def _iter_query(self, query, params=()):
+        # Курсор читается пачками, блокировка берётся только на время выборки пачки
+        with self._lock:
+            cursor = self.conn.execute(query, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            yield from rows
+
+    @_instrumented
+    def iter_restaurants(self):
+        for row in self._iter_query("SELECT id, name, phone, address FROM restaurants ORDER BY id"):
+            yield Restaurant(*row)
 
-        # Удаляем блюда этого ресторана
-        ws = wb[SHEET_MENU]
-        rows_to_delete = []
-        for row in ws.iter_rows(min_row=2):
-            if row[1].value == restaurant_id:
-                rows_to_delete.append(row[0].row)
+    @_instrumented
+    def iter_products(self, restaurant_id=None):
+        if restaurant_id is None:
+            rows = self._iter_query("SELECT id, restaurant_id, name, price, status FROM menu ORDER BY id")
+        else:
+            rows = self._iter_query("SELECT id, restaurant_id, name, price, status FROM menu "
+                                    "WHERE restaurant_id = ? ORDER BY id", (restaurant_id,))
+        for row in rows:
+            yield Product(*row)
 
-        for row_idx in sorted(rows_to_delete, reverse=True):
-            ws.delete_rows(row_idx)
+    @_instrumented
+    def get_restaurants(self):
+        return list(self.iter_restaurants())
 
-        wb.save(self.file)
+    @_instrumented
+    def get_products_for_restaurant(self, restaurant_id):
+        return list(self.iter_products(restaurant_id))
+
+    @_instrumented
+    @_synchronized
+    def load_restaurants_with_menus(self):
+        menus = {}
+        for product in self.iter_products():
+            menus.setdefault(product.restaurant_id, []).append(product)
+
+        restaurants = self.get_restaurants()
+        for restaurant in restaurants:
+            restaurant.menu = menus.get(restaurant.id, [])
+        return restaurants
 
+    def _update_fields(self, sheet, entity, fields):
+        # Обновляются только изменённые столбцы: правки других процессов
+        # в остальных полях той же строки не затираются
+        table, columns = TABLES[sheet]
+        if fields is None:
+            fields = [column for column in columns[1:] if column != "restaurant_id"]
+        if not fields:
+            return
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        cursor = self.conn.execute(f"UPDATE {table} SET {assignments} WHERE id = ?",
+                                   [getattr(entity, field) for field in fields] + [entity.id])
+        METRICS.add_rows(cursor.rowcount)
+
+    @_instrumented
+    @_synchronized
+    def save_restaurant(self, restaurant, fields=None):
+        with self.conn:
+            # Если это новый ресторан (без ID)
+            if not hasattr(restaurant, 'id') or not restaurant.id:
+                cursor = self.conn.execute("INSERT INTO restaurants (name, phone, address) VALUES (?, ?, ?)",
+                                           (restaurant.name, restaurant.phone, restaurant.address))
+                restaurant.id = cursor.lastrowid
+                METRICS.add_rows(cursor.rowcount)
+            else:
+                self._update_fields(SHEET_RESTAURANTS, restaurant, fields)
+        return restaurant
+
+    @_instrumented
+    @_synchronized
+    def save_product(self, product, fields=None):
+        with self.conn:
+            # Если это новое блюдо (без ID)
+            if not hasattr(product, 'id') or not product.id:
+                cursor = self.conn.execute("INSERT INTO menu (restaurant_id, name, price, status) VALUES (?, ?, ?, ?)",
+                                           (product.restaurant_id, product.name, product.price, product.status))
+                product.id = cursor.lastrowid
+                METRICS.add_rows(cursor.rowcount)
+            else:
+                self._update_fields(SHEET_MENU, product, fields)
+        return product
+
+    @_instrumented
+    @_synchronized
+    def delete_restaurant(self, restaurant_id):
+        # Блюда ресторана удаляются каскадно по внешнему ключу
+        with self.conn:
+            METRICS.add_rows(self.conn.execute("DELETE FROM restaurants WHERE id = ?", (restaurant_id,)).rowcount)
+
+    @_instrumented
+    @_synchronized
     def delete_product(self, product_id):
-        wb = openpyxl.load_workbook(self.file)
-        ws = wb[SHEET_MENU]
+        with self.conn:
+            METRICS.add_rows(self.conn.execute("DELETE FROM menu WHERE id = ?", (product_id,)).rowcount)
+
+    @_instrumented
+    @_synchronized
+    def save_many(self, restaurants=(), products=()):
+        with self.conn:
+            next_restaurant_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM restaurants").fetchone()[0]
+            next_product_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM menu").fetchone()[0]
+
+            all_products = list(products)
+            for restaurant in restaurants:
+                if not restaurant.id:
+                    restaurant.id = next_restaurant_id
+                    next_restaurant_id += 1
+                for product in getattr(restaurant, "menu", []):
+                    product.restaurant_id = restaurant.id
+                    all_products.append(product)
+            for product in all_products:
+                if not product.id:
+                    product.id = next_product_id
+                    next_product_id += 1
+
+            self.conn.executemany(
+                "INSERT INTO restaurants (id, name, phone, address) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, phone = excluded.phone, address = excluded.address",
+                [(r.id, r.name, r.phone, r.address) for r in restaurants])
+            self.conn.executemany(
+                "INSERT INTO menu (id, restaurant_id, name, price, status) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, price = excluded.price, status = excluded.status",
+                [(p.id, p.restaurant_id, p.name, p.price, p.status) for p in all_products])
+            METRICS.add_rows(len(restaurants) + len(all_products))
+
+
+def import_xlsx_to_sqlite(xlsx_file=EXCEL_FILE, db_file=DB_FILE):
+    # Переносит все листы книги в базу, заменяя её текущее содержимое. Книга читается
+    # вместе с ещё не сжатыми записями журнала
+    sheets = ExcelManager(xlsx_file).load_sheets()
+    storage = SQLiteManager(db_file)
+    try:
+        counts = {}
+        with storage.conn:
+            storage.conn.execute("DELETE FROM menu")
+            storage.conn.execute("DELETE FROM restaurants")
+            storage.conn.execute("DELETE FROM users")
+            restaurant_ids = set()
+            for sheet in (SHEET_USERS, SHEET_RESTAURANTS, SHEET_MENU):
+                table, columns = TABLES[sheet]
+                rows = [tuple(row[:len(columns)]) for row in sheets[sheet] if row and row[0]]
+                if sheet == SHEET_RESTAURANTS:
+                    restaurant_ids = {row[0] for row in rows}
+                elif sheet == SHEET_MENU:
+                    # Блюда без существующего ресторана в приложении не видны и нарушили бы внешний ключ
+                    rows = [row for row in rows if row[1] in restaurant_ids]
+                storage.conn.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+                counts[sheet] = len(rows)
+        return counts
+    finally:
+        storage.close()
+
+
+def export_sqlite_to_xlsx(db_file=DB_FILE, xlsx_file=EXCEL_FILE):
+    # Выгружает базу в книгу того же формата, что использует ExcelManager. Книга
+    # подменяется атомарно под файловой блокировкой, а её журнал сбрасывается
+    storage = SQLiteManager(db_file)
+    try:
+        sheets = {}
+        for sheet in (SHEET_USERS, SHEET_RESTAURANTS, SHEET_MENU):
+            table, columns = TABLES[sheet]
+            rows = storage.conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id").fetchall()
+            if table == "menu":
+                rows = [row[:4] + (bool(row[4]),) for row in rows]
+            sheets[sheet] = rows
+    finally:
+        storage.close()
+    ExcelManager(xlsx_file).replace_all(sheets)
+    return {sheet: len(rows) for sheet, rows in sheets.items()}
+
+
+class BulkImportResult:
+    def __init__(self):
+        self.restaurants = []
+        self.products = []
+        self.rejected = []
+
+    def reject(self, source, row_number, reason):
+        self.rejected.append((source, row_number, reason))
+
+
+def _read_bulk_source(path):
+    # Возвращает списки (источник, номер строки, запись) для ресторанов и блюд.
+    # Ключи записей совпадают с заголовками листов restaurant_data.xlsx
+    restaurants, products = [], []
+    name = os.path.basename(path)
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".json":
+        with open(path, encoding="utf-8") as source:
+            data = json.load(source)
+        for key, target in (("restaurants", restaurants), ("products", products)):
+            for number, record in enumerate(data.get(key, []), 1):
+                target.append((f"{name}:{key}", number, record))
+
+    elif extension == ".csv":
+        with open(path, encoding="utf-8-sig", newline="") as source:
+            reader = csv.DictReader(source)
+            target = products if "ID_ресторана" in (reader.fieldnames or []) else restaurants
+            for number, record in enumerate(reader, 2):
+                target.append((name, number, record))
+
+    elif extension == ".xlsx":
+        wb = _openpyxl().load_workbook(path, read_only=True)
+        try:
+            for sheet, target in ((SHEET_RESTAURANTS, restaurants), (SHEET_MENU, products)):
+                if sheet not in wb.sheetnames:
+                    continue
+                rows = wb[sheet].iter_rows(values_only=True)
+                header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+                for number, row in enumerate(rows, 2):
+                    if any(value is not None for value in row):
+                        target.append((f"{name}:{sheet}", number, dict(zip(header, row))))
+        finally:
+            wb.close()
+
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {extension or name}")
+    return restaurants, products
+
+
+def _parse_status(value):
+    if value is None or value == "":
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() not in ("0", "false", "нет", "не доступен", "недоступен")
+    return bool(value)
+
+
+def bulk_import(storage, paths, dry_run=False, history=None):
+    # Проверяет все записи одним проходом, назначает ID и сохраняет принятые
+    # рестораны и блюда одной записью в хранилище. С history импорт попадает
+    # в историю изменений, и откат не примет его строки за чужие
+    result = BulkImportResult()
+    restaurant_records, product_records = [], []
+    for path in paths:
+        restaurants, products = _read_bulk_source(path)
+        restaurant_records += restaurants
+        product_records += products
+
+    local_restaurants = {}
+    rejected_keys = set()
+    for source, number, record in restaurant_records:
+        key = record.get("ID")
+        try:
+            name = str(record.get("Название") or "").strip()
+            if not name:
+                raise ValueError("Пустое название")
+            phone = str(record.get("Телефон") or "").strip()
+            restaurant = Restaurant(None, name, phone, str(record.get("Адрес") or "").strip())
+        except ValueError as e:
+            result.reject(source, number, str(e))
+            if key not in (None, ""):
+                rejected_keys.add(str(key))
+            continue
+        restaurant.menu = []
+        result.restaurants.append(restaurant)
+        if key not in (None, ""):
+            local_restaurants[str(key)] = restaurant
+
+    # ID_ресторана сначала ищется среди ресторанов из входных файлов, затем среди уже сохранённых
+    existing_ids = {restaurant.id for restaurant in storage.get_restaurants()}
+    standalone = []
+    for source, number, record in product_records:
+        key = record.get("ID_ресторана")
+        try:
+            name = str(record.get("Название") or "").strip()
+            if not name:
+                raise ValueError("Пустое название")
+            try:
+                price = float(record.get("Цена"))
+            except (TypeError, ValueError):
+                raise ValueError("Цена должна быть числом")
+            product = Product(None, None, name, price, _parse_status(record.get("Статус")))
+        except ValueError as e:
+            result.reject(source, number, str(e))
+            continue
+
+        if str(key) in local_restaurants:
+            local_restaurants[str(key)].menu.append(product)
+        elif str(key) in rejected_keys:
+            result.reject(source, number, f"Ресторан {key} отклонён")
+            continue
+        else:
+            try:
+                product.restaurant_id = int(key)
+            except (TypeError, ValueError):
+                product.restaurant_id = None
+            if product.restaurant_id not in existing_ids:
+                result.reject(source, number, f"Ресторан {key} не найден")
+                continue
+            standalone.append(product)
+        result.products.append(product)
+
+    if not dry_run and (result.restaurants or standalone):
+        storage.save_many(result.restaurants, standalone)
+        if history is not None:
+            changes = ([[SHEET_RESTAURANTS, r.id, None, _restaurant_row(r)] for r in result.restaurants]
+                       + [[SHEET_MENU, p.id, None, _product_row(p)] for p in result.products])
+            history.record(f"Массовый импорт: ресторанов {len(result.restaurants)}, блюд {len(result.products)}",
+                           changes, lambda: _model_state(storage.load_restaurants_with_menus()))
+    return result
+
+
+# Параллельный разбор книги и выгрузка меню частями. Функции уровня модуля,
+# чтобы их можно было передавать в процессы ProcessPoolExecutor
+
+_shared_strings_cache = []
+
+
+def _init_parser(shared_strings):
+    # Таблица общих строк передаётся в процесс один раз, а не с каждым куском листа
+    global _shared_strings_cache
+    _shared_strings_cache = shared_strings
+
+
+def _shared_strings(archive):
+    try:
+        root = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+    except KeyError:
+        return []
+    return ["".join(text.text or "" for text in item.iter(f"{{{XLSX_NS['m']}}}t"))
+            for item in root.iterfind("m:si", XLSX_NS)]
+
+
+def _column_index(ref):
+    index = 0
+    for char in ref:
+        if char.isdigit():
+            break
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def _row_chunks(xml, pieces):
+    # Режет содержимое <sheetData> на куски примерно равного размера по границам <row.
+    # Элементы с префиксом пространства имён (<x:row>) так не режутся: ValueError
+    if re.search(rb"<[\w.-]+:row[\s>/]", xml):
+        raise ValueError("Лист записан с префиксом пространства имён")
+    start = xml.find(b"<row")
+    end = xml.rfind(b"</sheetData>")
+    if start < 0 or end < 0:
+        return []
+    chunks = []
+    step = max((end - start) // pieces, 1)
+    while start < end:
+        cut = xml.find(b"<row", min(start + step, end))
+        if cut < 0 or cut >= end:
+            cut = end
+        chunks.append(xml[start:cut])
+        start = cut
+    return chunks
+
+
+def _parse_rows(chunk, width):
+    # Разбирает кусок с элементами <row> в кортежи значений ширины width,
+    # приводя типы так же, как openpyxl. Строка заголовка пропускается
+    value_tag = f"{{{XLSX_NS['m']}}}v"
+    text_tag = f"{{{XLSX_NS['m']}}}t"
+    root = ElementTree.fromstring(f'<sheetData xmlns="{XLSX_NS["m"]}">'.encode() + chunk + b"</sheetData>")
+    rows = []
+    for row in root:
+        if row.get("r") is None:
+            raise ValueError("Строка листа без номера")
+        if row.get("r") == "1":
+            continue
+        values = [None] * width
+        for cell in row:
+            if cell.get("r") is None:
+                raise ValueError(f"Ячейка без адреса в строке {row.get('r')}")
+            col = _column_index(cell.get("r"))
+            if col >= width:
+                continue
+            kind = cell.get("t", "n")
+            if kind == "inlineStr":
+                values[col] = "".join(text.text or "" for text in cell.iter(text_tag))
+                continue
+            value = cell.findtext(value_tag)
+            if value is None:
+                continue
+            if kind == "n":
+                values[col] = float(value) if "." in value or "E" in value or "e" in value else int(value)
+            elif kind == "s":
+                values[col] = _shared_strings_cache[int(value)]
+            elif kind == "b":
+                values[col] = value == "1"
+            else:
+                values[col] = value
+        if any(value is not None for value in values):
+            rows.append(tuple(values))
+    return rows
+
+
+def parse_sheets_parallel(path, sheets=tuple(TABLES), workers=None):
+    # Листы книги, разобранные кусками в нескольких процессах: {лист: [кортежи строк]}.
+    # При workers=1 разбор идёт в текущем процессе тем же кодом. Разметку, которую
+    # этот разбор не понимает (префиксы пространств имён, ячейки без адреса), он не
+    # угадывает, а сообщает через ValueError — тогда книгу читает openpyxl
+    workers = workers or os.cpu_count() or 1
+    with zipfile.ZipFile(path) as archive:
+        paths = _sheet_paths(archive)
+        shared = _shared_strings(archive)
+        tasks = [(sheet, chunk) for sheet in sheets
+                 for chunk in _row_chunks(archive.read(paths[sheet]), workers * 4)]
+
+    result = {sheet: [] for sheet in sheets}
+    if workers == 1:
+        _init_parser(shared)
+        parts = [_parse_rows(chunk, len(HEADERS[sheet])) for sheet, chunk in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_parser,
+                                                    initargs=(shared,)) as pool:
+            parts = list(pool.map(_parse_rows, [chunk for _sheet, chunk in tasks],
+                                  [len(HEADERS[sheet]) for sheet, _chunk in tasks]))
+    for (sheet, _chunk), rows in zip(tasks, parts):
+        result[sheet] += rows
+    return result
+
+
+def _write_shard(directory, number, format_, restaurants, products):
+    # Записывает одну часть выгрузки в формате, который понимает bulk-import
+    base = os.path.join(directory, f"menu-{number:04d}")
+    if format_ == "json":
+        data = {"restaurants": [dict(zip(HEADERS[SHEET_RESTAURANTS], row)) for row in restaurants],
+                "products": [dict(zip(HEADERS[SHEET_MENU], row)) for row in products]}
+        with open(base + ".json", "w", encoding="utf-8") as target:
+            json.dump(data, target, ensure_ascii=False)
+        return [base + ".json"]
+    if format_ == "csv":
+        paths = []
+        for suffix, sheet, rows in (("restaurants", SHEET_RESTAURANTS, restaurants), ("menu", SHEET_MENU, products)):
+            paths.append(f"{base}-{suffix}.csv")
+            with open(paths[-1], "w", encoding="utf-8", newline="") as target:
+                writer = csv.writer(target)
+                writer.writerow(HEADERS[sheet])
+                writer.writerows(rows)
+        return paths
+    wb = _openpyxl().Workbook(write_only=True)
+    for sheet, rows in ((SHEET_RESTAURANTS, restaurants), (SHEET_MENU, products)):
+        ws = wb.create_sheet(sheet)
+        ws.append(HEADERS[sheet])
+        for row in rows:
+            ws.append(row)
+    wb.save(base + ".xlsx")
+    return [base + ".xlsx"]
+
+
+def export_shards(storage, directory, format_="csv", shards=None, workers=None):
+    # Выгружает рестораны с меню в shards частей (по умолчанию по числу процессов);
+    # части примерно равны по числу строк и пишутся параллельно
+    if format_ not in ("csv", "json", "xlsx"):
+        raise ValueError(f"Неподдерживаемый формат выгрузки: {format_}")
+    workers = workers or os.cpu_count() or 1
+    restaurants = storage.load_restaurants_with_menus()
+    shards = max(1, min(shards or workers, len(restaurants) or 1))
+    os.makedirs(directory, exist_ok=True)
+
+    total = sum(1 + len(restaurant.menu) for restaurant in restaurants)
+    groups, current, size = [], ([], []), 0
+    for restaurant in restaurants:
+        current[0].append((restaurant.id, restaurant.name, restaurant.phone, restaurant.address))
+        current[1].extend((p.id, p.restaurant_id, p.name, p.price, p.status) for p in restaurant.menu)
+        size += 1 + len(restaurant.menu)
+        if size >= total * (len(groups) + 1) / shards and len(groups) < shards - 1:
+            groups.append(current)
+            current = ([], [])
+    groups.append(current)
+
+    arguments = [(directory, number, format_, rows, products) for number, (rows, products) in enumerate(groups, 1)]
+    if workers == 1:
+        written = [_write_shard(*args) for args in arguments]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            written = list(pool.map(_write_shard, *zip(*arguments)))
+    return [path for paths in written for path in paths]
+
+
+class SearchIndex:
+    # Инвертированный индекс по названиям, адресам и блюдам ресторанов.
+    # Токены хранятся в отсортированном списке для поиска по префиксу,
+    # а их триграммы — для поиска по подстроке и с опечатками
+    FIELD_WEIGHTS = {"name": 3.0, "address": 2.0, "menu": 1.0}
+    EXACT, PREFIX, SUBSTRING, TYPO = 1.0, 0.8, 0.6, 0.4
+
+    def __init__(self, restaurants=()):
+        self.postings = {}
+        self.trigrams = {}
+        self.tokens = []
+        self.documents = {}
+        self.restaurants = {}
+        # При начальном построении список токенов сортируется один раз в конце,
+        # а не вставкой каждого нового токена
+        self._bulk = True
+        for restaurant in restaurants:
+            self.add(restaurant)
+        self._bulk = False
+        self.tokens = sorted(self.postings)
+
+    @staticmethod
+    def tokenize(text):
+        return re.findall(r"\w+", str(text or "").lower().replace("ё", "е"))
+
+    @staticmethod
+    def _trigrams(token):
+        padded = f"^{token}$"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _document(self, restaurant):
+        weights = {}
+        fields = [("name", restaurant.name), ("address", restaurant.address)]
+        fields += [("menu", product.name) for product in getattr(restaurant, "menu", [])]
+        for field, text in fields:
+            for token in self.tokenize(text):
+                weights[token] = max(weights.get(token, 0.0), self.FIELD_WEIGHTS[field])
+        return weights
+
+    def add(self, restaurant):
+        document = self._document(restaurant)
+        self.documents[restaurant.id] = document
+        self.restaurants[restaurant.id] = restaurant
+        for token, weight in document.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                if not self._bulk:
+                    bisect.insort(self.tokens, token)
+                for trigram in self._trigrams(token):
+                    self.trigrams.setdefault(trigram, set()).add(token)
+            self.postings[token][restaurant.id] = weight
+
+    def remove(self, restaurant_id):
+        self.restaurants.pop(restaurant_id, None)
+        for token in self.documents.pop(restaurant_id, {}):
+            postings = self.postings[token]
+            del postings[restaurant_id]
+            if not postings:
+                del self.postings[token]
+                del self.tokens[bisect.bisect_left(self.tokens, token)]
+                for trigram in self._trigrams(token):
+                    self.trigrams[trigram].discard(token)
+                    if not self.trigrams[trigram]:
+                        del self.trigrams[trigram]
+
+    def update(self, restaurant):
+        self.remove(restaurant.id)
+        self.add(restaurant)
+
+    def _matching_tokens(self, term):
+        # Возвращает {токен: коэффициент} для одного слова запроса
+        matches = {}
+        if term in self.postings:
+            matches[term] = self.EXACT
+
+        position = bisect.bisect_left(self.tokens, term)
+        while position < len(self.tokens) and self.tokens[position].startswith(term):
+            matches.setdefault(self.tokens[position], self.PREFIX)
+            position += 1
+
+        if len(term) < 3:
+            # Для коротких запросов триграмм нет — проверяем словарь, а не рестораны
+            for token in self.tokens:
+                if term in token:
+                    matches.setdefault(token, self.SUBSTRING)
+            return matches
+
+        term_trigrams = self._trigrams(term)
+        inner = {trigram for trigram in term_trigrams if "^" not in trigram and "$" not in trigram}
+        counts = {}
+        for trigram in term_trigrams:
+            for token in self.trigrams.get(trigram, ()):
+                counts[token] = counts.get(token, 0) + 1
+        max_typos = 1 if len(term) <= 5 else 2
+        for token, shared in counts.items():
+            if token in matches:
+                continue
+            if inner and term in token:
+                matches[token] = self.SUBSTRING
+            elif shared >= len(term_trigrams) - 3 * max_typos and \
+                    _edit_distance(term, token, max_typos) <= max_typos:
+                matches[token] = self.TYPO
+        return matches
+
+    def search(self, query, limit=None):
+        terms = self.tokenize(query)
+        if not terms:
+            return []
+
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for token, factor in self._matching_tokens(term).items():
+                postings = self.postings[token]
+                # После первого слова достаточно проверять уже найденные рестораны
+                if scores is not None and len(scores) < len(postings):
+                    candidates = ((rid, postings[rid]) for rid in scores if rid in postings)
+                else:
+                    candidates = postings.items()
+                for restaurant_id, weight in candidates:
+                    score = factor * weight
+                    if score > term_scores.get(restaurant_id, 0.0):
+                        term_scores[restaurant_id] = score
+            # Ресторан должен подходить под каждое слово запроса
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {rid: scores[rid] + score for rid, score in term_scores.items() if rid in scores}
+            if not scores:
+                return []
 
-        for row in ws.iter_rows(min_row=2):
-            if row[0].value == product_id:
-                ws.delete_rows(row[0].row)
-                break
+        def rank(rid):
+            return -scores[rid], str(self.restaurants[rid].name or "")
+
+        if limit is None:
+            ranked = sorted(scores, key=rank)
+        else:
+            ranked = heapq.nsmallest(limit, scores, key=rank)
+        return [self.restaurants[rid] for rid in ranked]
+
+
+def _edit_distance(a, b, limit):
+    # Расстояние Левенштейна с ранним выходом, когда оно заведомо больше limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class MenuQuery:
+    # Индексы для аналитических запросов по меню поверх MenuTable: в таблице лежат
+    # проиндексированные ID ресторанов, цены и битовая маска статусов, рядом —
+    # общий и по-ресторанный списки (цена, ID) по возрастанию цены и суммы по
+    # ресторанам. Всё поддерживается при каждом изменении блюда, поэтому запросы
+    # не сканируют меню целиком
+    def __init__(self, restaurants=()):
+        self.table = MenuTable()
+        self.products = {}
+        self.prices = []
+        self.by_restaurant = {}
+        # ID ресторана → [число блюд, доступных, сумма цен]
+        self._totals = {}
+        # Как и в SearchIndex, при начальном построении списки сортируются один раз
+        self._bulk = True
+        for restaurant in restaurants:
+            for product in getattr(restaurant, "menu", []):
+                self.add(product)
+        self._bulk = False
+        self.prices.sort()
+        for prices in self.by_restaurant.values():
+            prices.sort()
+
+    def add(self, product):
+        if product.id in self.products:
+            self.remove(product.id)
+        row = self.table.add(product.id, product.restaurant_id, product.name, product.price, product.status)
+        self.products[product.id] = product
+        restaurant_id, price = row.restaurant_id, row.price
+
+        prices = self.by_restaurant.setdefault(restaurant_id, [])
+        if self._bulk:
+            self.prices.append((price, product.id))
+            prices.append((price, product.id))
+        else:
+            bisect.insort(self.prices, (price, product.id))
+            bisect.insort(prices, (price, product.id))
+        totals = self._totals.setdefault(restaurant_id, [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += bool(product.status)
+        totals[2] += price
+
+    def remove(self, product_id):
+        # Строка таблицы хранит значения на момент индексации, даже если объект блюда уже изменён
+        row = self.table.get(product_id)
+        if row is None:
+            return
+        restaurant_id, price, available = row.restaurant_id, row.price, row.status
+        self.table.remove(product_id)
+        del self.products[product_id]
+        del self.prices[bisect.bisect_left(self.prices, (price, product_id))]
+        prices = self.by_restaurant[restaurant_id]
+        del prices[bisect.bisect_left(prices, (price, product_id))]
+        totals = self._totals[restaurant_id]
+        totals[0] -= 1
+        totals[1] -= available
+        totals[2] -= price
+        if not prices:
+            del self.by_restaurant[restaurant_id]
+            del self._totals[restaurant_id]
+
+    def update(self, product):
+        row = self.table.get(product.id)
+        if row is not None and row.restaurant_id == (product.restaurant_id or 0) and row.price == float(product.price):
+            # Изменились только название или статус: списки цен остаются как есть
+            self.products[product.id] = product
+            row.name = product.name
+            if row.status != bool(product.status):
+                row.status = product.status
+                self._totals[row.restaurant_id][1] += 1 if product.status else -1
+            return
+        self.add(product)
+
+    def remove_restaurant(self, restaurant_id):
+        for _price, product_id in list(self.by_restaurant.get(restaurant_id, [])):
+            self.remove(product_id)
+
+    def scale_prices(self, restaurant_id, factor):
+        # Новые цены считаются одной операцией над столбцом цен таблицы, списки цен
+        # ресторана и общий пересобираются слиянием. Возвращает изменённые блюда
+        old = self.by_restaurant.get(restaurant_id)
+        if not old:
+            return []
+        product_ids = self.table.scale_prices(restaurant_id, factor)
+        products = []
+        for product_id in product_ids:
+            product = self.products[product_id]
+            product.price = self.table.get(product_id).price
+            products.append(product)
+        prices = sorted((product.price, product.id) for product in products)
+        old = set(old)
+        self.prices = list(heapq.merge([item for item in self.prices if item not in old], prices))
+        self.by_restaurant[restaurant_id] = prices
+        self._totals[restaurant_id][2] = sum(price for price, _id in prices)
+        return products
+
+    def _matches(self, product_id, available):
+        return available is None or self.table.get(product_id).status == bool(available)
+
+    def available_under(self, max_price, restaurant_id=None):
+        # Доступные блюда не дороже max_price по возрастанию цены: выборка по столбцам таблицы
+        products = [self.products[product_id] for product_id in self.table.available_under(max_price, restaurant_id)]
+        products.sort(key=lambda product: (product.price, product.id))
+        return products
+
+    def with_status(self, available=True):
+        # Все доступные (или недоступные) блюда в порядке ID
+        ids = self.table.ids
+        products = [self.products[ids[position]] for position in self.table.select(available=available)]
+        products.sort(key=lambda product: product.id)
+        return products
+
+    def price_range(self, min_price=None, max_price=None, available=None, restaurant_id=None):
+        # Блюда с ценой в [min_price, max_price] по возрастанию цены
+        prices = self.prices if restaurant_id is None else self.by_restaurant.get(restaurant_id, [])
+        start = 0 if min_price is None else bisect.bisect_left(prices, (float(min_price),))
+        end = len(prices) if max_price is None else bisect.bisect_right(prices, (float(max_price), float("inf")))
+        return [self.products[product_id] for _price, product_id in prices[start:end]
+                if self._matches(product_id, available)]
+
+    def cheapest(self, restaurant_id=None, available=True):
+        # Самое дешёвое блюдо ресторана (по умолчанию среди доступных);
+        # без restaurant_id — словарь ID ресторана → блюдо по всем ресторанам
+        if restaurant_id is None:
+            found = {rid: self.cheapest(rid, available) for rid in self.by_restaurant}
+            return {rid: product for rid, product in found.items() if product is not None}
+        for _price, product_id in self.by_restaurant.get(restaurant_id, []):
+            if self._matches(product_id, available):
+                return self.products[product_id]
+        return None
+
+    def aggregates(self, restaurant_id=None):
+        # Число блюд, доступных, минимальная, максимальная и средняя цена;
+        # без restaurant_id — словарь по всем ресторанам с блюдами
+        if restaurant_id is None:
+            return {rid: self.aggregates(rid) for rid in self.by_restaurant}
+        prices = self.by_restaurant.get(restaurant_id)
+        if not prices:
+            return {"count": 0, "available": 0, "min": None, "max": None, "mean": None}
+        count, available, total = self._totals[restaurant_id]
+        return {"count": count, "available": available, "min": prices[0][0], "max": prices[-1][0],
+                "mean": round(total / count, 2)}
+
+
+class History:
+    # История изменений для отмены, повтора и отката к моменту времени. Каждая запись —
+    # строка JSON с изменёнными строками [лист, ID, было, стало] (None — строки нет),
+    # так что одна запись служит и прямой, и обратной дельтой. Каждые snapshot_interval
+    # записей рядом пишется сжатый снимок всех ресторанов и блюд: состояние на любой
+    # момент собирается из ближайшего снимка и не более snapshot_interval записей.
+    # Хранятся последние keep_snapshots снимков; записи старше первого из них удаляются
+    def __init__(self, file, snapshot_interval=HISTORY_SNAPSHOT_INTERVAL, keep_snapshots=HISTORY_SNAPSHOTS):
+        self.file = file
+        self.snapshot_dir = file + ".snapshots"
+        self.snapshot_interval = snapshot_interval
+        self.keep_snapshots = keep_snapshots
+        # Файл читается лениво, при первом обращении к истории
+        self.entries = None
+        self.undo_stack = []
+        self.redo_stack = []
+        self.last_seq = 0
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.RLock()
+        self._lock_fd = None
+
+    @contextmanager
+    def _locked(self):
+        # Историю одной книги могут дописывать несколько процессов; блокируется
+        # отдельный файл, потому что сам файл истории подменяется при сжатии
+        with self._lock:
+            if self._lock_fd is None:
+                self._lock_fd = open(self.file + ".lock", "a")
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self._load()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _load(self):
+        # Дочитывает записи, добавленные после прошлого чтения; после сжатия
+        # истории другим процессом файл перечитывается целиком
+        try:
+            stat = os.stat(self.file)
+        except FileNotFoundError:
+            stat = None
+        if self.entries is None or stat is None or stat.st_ino != self._inode or stat.st_size < self._offset:
+            self.entries = {}
+            self.undo_stack, self.redo_stack = [], []
+            self._offset = 0
+            self._inode = stat.st_ino if stat else None
+        if stat is None or stat.st_size == self._offset:
+            return
+        with open(self.file, "rb") as history:
+            history.seek(self._offset)
+            for line in history:
+                if not line.endswith(b"\n"):
+                    break
+                self._offset += len(line)
+                try:
+                    self._track(json.loads(line))
+                except ValueError:
+                    continue
+
+    def _track(self, entry):
+        # Стеки отмены и повтора восстанавливаются из самих записей: запись с "undoes"
+        # отменяет вершину стека отмены, с "redoes" — повторяет вершину стека повтора,
+        # любая другая запись начинает новую ветку и очищает стек повтора
+        seq = entry["seq"]
+        self.entries[seq] = entry
+        self.last_seq = max(self.last_seq, seq)
+        if "undoes" in entry:
+            if self.undo_stack and self.undo_stack[-1] == entry["undoes"]:
+                self.undo_stack.pop()
+            self.redo_stack.append(entry["undoes"])
+        elif "redoes" in entry:
+            if self.redo_stack and self.redo_stack[-1] == entry["redoes"]:
+                self.redo_stack.pop()
+            self.undo_stack.append(seq)
+        else:
+            self.undo_stack.append(seq)
+            self.redo_stack.clear()
 
-        wb.save(self.file)
+    def _snapshots(self):
+        try:
+            names = os.listdir(self.snapshot_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name.split(".")[0]) for name in names if name.endswith(".snapshot"))
+
+    def _snapshot_path(self, seq):
+        return os.path.join(self.snapshot_dir, f"{seq:010d}.snapshot")
+
+    def _write_snapshot(self, seq, timestamp, state):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        data = {"seq": seq, "time": timestamp, "rows": {sheet: list(rows.values()) for sheet, rows in state.items()}}
+        path = self._snapshot_path(seq)
+        with open(path + ".tmp", "wb") as f:
+            f.write(zlib.compress(marshal.dumps(data), 1))
+        os.replace(path + ".tmp", path)
+
+    def _read_snapshot(self, seq):
+        with open(self._snapshot_path(seq), "rb") as f:
+            data = marshal.loads(zlib.decompress(f.read()))
+        return data["time"], {sheet: {row[0]: row for row in rows} for sheet, rows in data["rows"].items()}
+
+    @staticmethod
+    def _replay(state, changes, forward=True):
+        for sheet, id_, before, after in changes:
+            row = after if forward else before
+            if row is None:
+                state[sheet].pop(id_, None)
+            else:
+                state[sheet][id_] = row
+
+    def _prune(self):
+        # Снимки сверх keep_snapshots удаляются вместе с записями до нового первого снимка
+        snapshots = self._snapshots()
+        if len(snapshots) <= self.keep_snapshots:
+            return
+        for seq in snapshots[:-self.keep_snapshots]:
+            os.remove(self._snapshot_path(seq))
+        base = snapshots[-self.keep_snapshots]
+        kept = [entry for seq, entry in sorted(self.entries.items()) if seq > base]
+        tmp_file = self.file + ".tmp"
+        with open(tmp_file, "wb") as target:
+            for entry in kept:
+                target.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+        os.replace(tmp_file, self.file)
+        self.entries = {entry["seq"]: entry for entry in kept}
+        self.undo_stack = [seq for seq in self.undo_stack if seq in self.entries]
+        self.redo_stack = [seq for seq in self.redo_stack if seq in self.entries]
+        stat = os.stat(self.file)
+        self._inode, self._offset = stat.st_ino, stat.st_size
+
+    @classmethod
+    def for_storage(cls, storage):
+        return cls(storage.file + ".history")
+
+    def record(self, label, changes, state, **links):
+        # state — функция, возвращающая текущее состояние {лист: {ID: строка}} после
+        # изменения; она нужна только для начального снимка. Последующие снимки
+        # собираются из истории, поэтому не зависят от того, какой процесс их пишет.
+        # Отмена и повтор записываются, даже если ни одна строка не применилась
+        if not changes and not links:
+            return None
+        with self._locked():
+            entry = dict({"seq": self.last_seq + 1, "time": time.time(), "label": label, "changes": changes}, **links)
+            if not self._snapshots():
+                # Первый снимок — состояние до самой первой записи
+                base = state()
+                self._replay(base, changes, forward=False)
+                self._write_snapshot(entry["seq"] - 1, entry["time"], base)
+            with open(self.file, "ab") as history:
+                history.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+                self._offset = history.tell()
+            if self._inode is None:
+                self._inode = os.stat(self.file).st_ino
+            self._track(entry)
+            if entry["seq"] % self.snapshot_interval == 0:
+                self._write_snapshot(entry["seq"], entry["time"], self._state_at(entry["seq"]))
+                self._prune()
+        return entry
+
+    def undo_entry(self):
+        with self._locked():
+            return self.entries[self.undo_stack[-1]] if self.undo_stack else None
+
+    def redo_entry(self):
+        with self._locked():
+            return self.entries[self.redo_stack[-1]] if self.redo_stack else None
+
+    def recent(self, limit=PAGE_SIZE):
+        with self._locked():
+            return [self.entries[seq] for seq in sorted(self.entries)[-limit:]]
+
+    def seq_at(self, timestamp):
+        # Номер последней записи, сделанной не позже timestamp
+        with self._locked():
+            snapshots = self._snapshots()
+            if not snapshots:
+                raise ValueError("История пуста")
+            # Начальный снимок (0) описывает состояние до первой записи, более
+            # поздний первый снимок — только момент, когда он сделан
+            base = snapshots[0]
+            if base > 0 and self._read_snapshot(base)[0] > timestamp:
+                raise ValueError("История не хранит изменения до этого момента")
+            return max((seq for seq, entry in self.entries.items() if entry["time"] <= timestamp), default=base)
+
+    def _state_at(self, seq):
+        snapshots = [snapshot for snapshot in self._snapshots() if snapshot <= seq]
+        if not snapshots or seq > self.last_seq:
+            raise ValueError(f"Запись {seq} не найдена в истории")
+        _time, state = self._read_snapshot(snapshots[-1])
+        for number in range(snapshots[-1] + 1, seq + 1):
+            self._replay(state, self.entries[number]["changes"])
+        return state
+
+    def state_at(self, seq):
+        # Состояние после записи seq: ближайший снимок и не больше snapshot_interval записей
+        with self._locked():
+            return self._state_at(seq)
+
+    def rollback_changes(self, seq):
+        # Изменения [лист, ID, было, стало], возвращающие строки, которые меняли записи
+        # после seq, к состоянию после seq. «Было» — значение по последней записи истории.
+        # Строки, которых история после seq не касалась, не затрагиваются
+        with self._locked():
+            target = self._state_at(seq)
+            latest = self._state_at(self.last_seq)
+            touched = {(sheet, id_) for number in range(seq + 1, self.last_seq + 1)
+                       for sheet, id_, _before, _after in self.entries[number]["changes"]}
+            changes = []
+            for sheet, id_ in sorted(touched):
+                before, after = latest[sheet].get(id_), target[sheet].get(id_)
+                if before != after:
+                    changes.append([sheet, id_, before, after])
+            return changes
+
+
+def _restaurant_row(restaurant):
+    return [restaurant.id, restaurant.name, restaurant.phone, restaurant.address]
+
+
+def _product_row(product):
+    return [product.id, product.restaurant_id, product.name, product.price, product.status]
+
+
+def _model_state(restaurants):
+    # Состояние для истории: {лист: {ID: строка}}
+    return {SHEET_RESTAURANTS: {r.id: _restaurant_row(r) for r in restaurants},
+            SHEET_MENU: {p.id: _product_row(p) for r in restaurants for p in r.menu}}
+
+
+def _restaurant_json(restaurant):
+    return {"id": restaurant.id, "name": restaurant.name, "phone": restaurant.phone, "address": restaurant.address}
+
+
+def _product_json(product):
+    return {"id": product.id, "restaurant_id": product.restaurant_id, "name": product.name,
+            "price": product.price, "status": product.status}
+
+
+class RenderCache:
+    # LRU отрисованных списков и карточек в текстовом и JSON-виде.
+    # Ключ — (вид, ID ресторана, версия данных, формат). Изменение ресторана или его
+    # меню повышает версию и сразу удаляет устаревшие записи
+    FORMATS = ("text", "json")
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, restaurant_id, format_, build):
+        key = (kind, restaurant_id, self.versions.get((kind, restaurant_id), 0), format_)
+        value = self.entries.get(key)
+        if value is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+        self.misses += 1
+        value = self.entries[key] = build()
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return value
+
+    def _bump(self, kind, restaurant_id):
+        version = self.versions.get((kind, restaurant_id), 0)
+        for format_ in self.FORMATS:
+            self.entries.pop((kind, restaurant_id, version, format_), None)
+        self.versions[(kind, restaurant_id)] = version + 1
+
+    def invalidate_restaurant(self, restaurant_id):
+        # Название, телефон или адрес: меняются карточка ресторана и общий список
+        self._bump("restaurant", restaurant_id)
+        self._bump("listing", None)
+
+    def invalidate_menu(self, restaurant_id):
+        self._bump("menu", restaurant_id)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "maxsize": self.maxsize}
 
 
 class RestaurantManager:
-    def __init__(self):
-        self.excel = ExcelManager()
+    def __init__(self, storage=None):
+        self.storage = storage or ExcelManager(session=True, autosave_interval=AUTOSAVE_INTERVAL)
         self.current_user = None
         self.restaurants = []
+        self.render_cache = RenderCache()
+        self.history = History.for_storage(self.storage)
         self.load_data()
 
     def load_data(self):
-        self.restaurants = self.excel.get_restaurants()
-        for restaurant in self.restaurants:
-            restaurant.menu = self.excel.get_products_for_restaurant(restaurant.id)
+        self.set_restaurants(self.storage.load_restaurants_with_menus())
+
+    def set_restaurants(self, restaurants):
+        self.restaurants = restaurants
+        self.search_index = SearchIndex(self.restaurants)
+        self.menu_query = MenuQuery(self.restaurants)
+        self.render_cache.clear()
+
+    # Отрисовка через кэш: format_ — "text" для консоли или "json" для сервиса
+
+    def render_listing(self, format_="text"):
+        render = _restaurant_json if format_ == "json" else (lambda r: f"{r.name} - {r.address}")
+        return self.render_cache.get("listing", None, format_, lambda: [render(r) for r in self.restaurants])
+
+    def render_restaurant(self, restaurant, format_="text"):
+        render = _restaurant_json if format_ == "json" else str
+        return self.render_cache.get("restaurant", restaurant.id, format_, lambda: render(restaurant))
+
+    def render_menu(self, restaurant, format_="text"):
+        render = _product_json if format_ == "json" else str
+        return self.render_cache.get("menu", restaurant.id, format_, lambda: [render(p) for p in restaurant.menu])
+
+    # Операции над моделью: сохраняют изменения в хранилище и обновляют индексы
+
+    def add_restaurant(self, name, phone, address):
+        restaurant = Restaurant(None, name, phone, address)
+        restaurant = self.storage.save_restaurant(restaurant)
+        restaurant.menu = []
+        self.restaurants.append(restaurant)
+        self.search_index.add(restaurant)
+        self.render_cache.invalidate_restaurant(restaurant.id)
+        self.record_history(f"Добавлен ресторан '{restaurant.name}'",
+                            [[SHEET_RESTAURANTS, restaurant.id, None, _restaurant_row(restaurant)]])
+        return restaurant
+
+    def update_restaurant(self, restaurant, name=None, phone=None, address=None):
+        before = _restaurant_row(restaurant)
+        restaurant.update_info(new_name=name, new_phone=phone, new_address=address)
+        fields = [field for field, value in (("name", name), ("phone", phone), ("address", address)) if value]
+        if not fields:
+            return
+        self.storage.save_restaurant(restaurant, fields)
+        self.search_index.update(restaurant)
+        self.render_cache.invalidate_restaurant(restaurant.id)
+        self.record_history(f"Изменён ресторан '{restaurant.name}'",
+                            [[SHEET_RESTAURANTS, restaurant.id, before, _restaurant_row(restaurant)]])
+
+    def remove_restaurant(self, restaurant):
+        self.storage.delete_restaurant(restaurant.id)
+        self.restaurants.remove(restaurant)
+        self.search_index.remove(restaurant.id)
+        self.menu_query.remove_restaurant(restaurant.id)
+        self.render_cache.invalidate_restaurant(restaurant.id)
+        self.render_cache.invalidate_menu(restaurant.id)
+        # Вместе с рестораном в запись попадают все его блюда, чтобы отмена вернула и их
+        self.record_history(f"Удалён ресторан '{restaurant.name}' ({len(restaurant.menu)} блюд)",
+                            [[SHEET_RESTAURANTS, restaurant.id, _restaurant_row(restaurant), None]]
+                            + [[SHEET_MENU, product.id, _product_row(product), None] for product in restaurant.menu])
+
+    def add_product(self, restaurant, name, price):
+        product = Product(None, restaurant.id, name, float(price))
+        product = self.storage.save_product(product)
+        restaurant.menu.append(product)
+        self.search_index.update(restaurant)
+        self.menu_query.add(product)
+        self.render_cache.invalidate_menu(restaurant.id)
+        self.record_history(f"Добавлено блюдо '{product.name}'",
+                            [[SHEET_MENU, product.id, None, _product_row(product)]])
+        return product
+
+    def update_product(self, restaurant, product, name=None, price=None):
+        # Цена проверяется до изменения блюда, чтобы при ошибке ничего не поменялось
+        new_price = float(price) if price is not None else product.price
+        before = _product_row(product)
+        if name:
+            product.update_name(name)
+        product.update_price(new_price)
+        self.storage.save_product(product, ["name", "price"])
+        self.search_index.update(restaurant)
+        self.menu_query.update(product)
+        self.render_cache.invalidate_menu(restaurant.id)
+        self.record_history(f"Изменено блюдо '{product.name}'",
+                            [[SHEET_MENU, product.id, before, _product_row(product)]])
+
+    def toggle_product_status(self, restaurant, product):
+        before = _product_row(product)
+        new_status = product.change_status()
+        self.storage.save_product(product, ["status"])
+        self.menu_query.update(product)
+        self.render_cache.invalidate_menu(restaurant.id)
+        self.record_history(f"Изменён статус блюда '{product.name}'",
+                            [[SHEET_MENU, product.id, before, _product_row(product)]])
+        return new_status
+
+    def scale_prices(self, restaurant, percent):
+        # Меняет цены всех блюд ресторана на percent процентов
+        factor = 1 + float(percent) / 100
+        if factor <= 0:
+            raise ValueError("Цены должны остаться положительными")
+        before = {product.id: _product_row(product) for product in restaurant.menu}
+        products = self.menu_query.scale_prices(restaurant.id, factor)
+        with self.storage.batch():
+            for product in products:
+                self.storage.save_product(product, ["price"])
+        self.render_cache.invalidate_menu(restaurant.id)
+        self.record_history(f"Изменены цены ресторана '{restaurant.name}' на {float(percent):+g}%",
+                            [[SHEET_MENU, product.id, before[product.id], _product_row(product)]
+                             for product in products])
+        return len(products)
+
+    def remove_product(self, restaurant, product):
+        self.storage.delete_product(product.id)
+        restaurant.menu.remove(product)
+        self.search_index.update(restaurant)
+        self.menu_query.remove(product.id)
+        self.render_cache.invalidate_menu(restaurant.id)
+        self.record_history(f"Удалено блюдо '{product.name}'",
+                            [[SHEET_MENU, product.id, _product_row(product), None]])
+
+    # История: отмена, повтор и откат к моменту времени
+
+    def _state(self):
+        return _model_state(self.restaurants)
+
+    def record_history(self, label, changes, **links):
+        # Вызывается после изменения модели. Сервис и массовый импорт пишут в History
+        # сами, собирая начальное состояние из хранилища
+        return self.history.record(label, changes, self._state, **links)
+
+    def _apply_history(self, changes):
+        # Записывает строки «стало» из изменений в хранилище одним пакетом и
+        # применяет их к модели так же, как изменения других процессов. Строка,
+        # которая сейчас не совпадает с «было» (её изменил другой процесс или
+        # она удалена вместе с рестораном), не трогается и возвращается как конфликт
+        self.refresh()
+        current = self._state()
+        applied, conflicts = [], []
+        for change in changes:
+            sheet, id_, before, _after = change
+            (applied if current[sheet].get(id_) == before else conflicts).append(change)
+
+        # Блюда ресторана, которого уже нет, не возвращаются
+        restaurant_ids = set(current[SHEET_RESTAURANTS])
+        for sheet, id_, _before, after in applied:
+            if sheet == SHEET_RESTAURANTS:
+                (restaurant_ids.add if after is not None else restaurant_ids.discard)(id_)
+        orphans = [change for change in applied
+                   if change[0] == SHEET_MENU and change[3] is not None and change[3][1] not in restaurant_ids]
+        applied = [change for change in applied if change not in orphans]
+        conflicts += orphans
+
+        puts = {SHEET_RESTAURANTS: [], SHEET_MENU: []}
+        deletes = {SHEET_RESTAURANTS: [], SHEET_MENU: []}
+        # Вернувшиеся строки дописываются в порядке ID, как они шли в листе и меню
+        for sheet, id_, _before, after in sorted(applied, key=lambda change: change[1]):
+            if after is None:
+                deletes[sheet].append(id_)
+            else:
+                puts[sheet].append(after)
+
+        with self.storage.batch():
+            if puts[SHEET_RESTAURANTS] or puts[SHEET_MENU]:
+                self.storage.save_many([Restaurant(*row) for row in puts[SHEET_RESTAURANTS]],
+                                       [Product(*row) for row in puts[SHEET_MENU]])
+            for id_ in deletes[SHEET_MENU]:
+                self.storage.delete_product(id_)
+            for id_ in deletes[SHEET_RESTAURANTS]:
+                self.storage.delete_restaurant(id_)
+
+        model_changes = StorageChanges()
+        model_changes.collect([("put", sheet, row) for sheet in (SHEET_RESTAURANTS, SHEET_MENU) for row in puts[sheet]]
+                              + [("delete", SHEET_MENU, deletes[SHEET_MENU]),
+                                 ("delete", SHEET_RESTAURANTS, deletes[SHEET_RESTAURANTS])])
+        self.apply_changes(model_changes)
+        return applied, conflicts
+
+    def undo(self):
+        # Отменяет последнее действие; возвращает его запись и число пропущенных строк
+        # или (None, 0), если отменять нечего
+        entry = self.history.undo_entry()
+        if entry is None:
+            return None, 0
+        changes = [[sheet, id_, after, before] for sheet, id_, before, after in entry["changes"]]
+        applied, conflicts = self._apply_history(changes)
+        self.record_history(f"Отмена: {entry['label']}", applied, undoes=entry["seq"])
+        return entry, len(conflicts)
+
+    def redo(self):
+        entry = self.history.redo_entry()
+        if entry is None:
+            return None, 0
+        applied, conflicts = self._apply_history(entry["changes"])
+        self.record_history(f"Повтор: {entry['label']}", applied, redoes=entry["seq"])
+        return entry, len(conflicts)
+
+    def rollback(self, seq):
+        # Возвращает строки, изменённые записями после seq, к состоянию после записи seq.
+        # Строки, которых история не касалась, и строки, изменённые в обход неё,
+        # остаются как есть. Откат — обычная запись истории, поэтому его тоже можно
+        # отменить. Возвращает число изменённых и пропущенных строк
+        applied, conflicts = self._apply_history(self.history.rollback_changes(seq))
+        if applied:
+            self.record_history(f"Откат к записи {seq}", applied)
+        return len(applied), len(conflicts)
+
+    def refresh(self):
+        # Подтягивает изменения других процессов в рестораны, меню и поисковый индекс
+        changes = self.storage.refresh()
+        if changes.reload:
+            self.load_data()
+        elif changes:
+            self.apply_changes(changes)
+
+    def apply_changes(self, changes):
+        by_id = {restaurant.id: restaurant for restaurant in self.restaurants}
+        touched = set()
+        for id_, fields in changes.rows[SHEET_RESTAURANTS].items():
+            self.render_cache.invalidate_restaurant(id_)
+            restaurant = by_id.get(id_)
+            if fields is None:
+                if restaurant is not None:
+                    self.restaurants.remove(restaurant)
+                    self.search_index.remove(id_)
+                    self.menu_query.remove_restaurant(id_)
+                    del by_id[id_]
+            elif restaurant is None:
+                restaurant = Restaurant(id_, fields.get("name"), fields.get("phone"), fields.get("address"))
+                self.restaurants.append(restaurant)
+                by_id[id_] = restaurant
+                touched.add(id_)
+            else:
+                for field in ("name", "phone", "address"):
+                    if field in fields:
+                        setattr(restaurant, field, fields[field])
+                touched.add(id_)
+
+        products = {product.id: (restaurant, product) for restaurant in self.restaurants for product in restaurant.menu}
+        for id_, fields in changes.rows[SHEET_MENU].items():
+            restaurant, product = products.get(id_, (None, None))
+            if product is not None and (fields is None or fields.get("restaurant_id", restaurant.id) != restaurant.id):
+                restaurant.menu.remove(product)
+                self.menu_query.remove(id_)
+                touched.add(restaurant.id)
+                product = None
+            if fields is None:
+                continue
+            if product is None:
+                restaurant = by_id.get(fields.get("restaurant_id"))
+                if restaurant is None:
+                    continue
+                product = Product(id_, restaurant.id, fields.get("name"), fields.get("price"), fields.get("status", True))
+                restaurant.menu.append(product)
+            else:
+                for field in ("name", "price", "status"):
+                    if field in fields:
+                        setattr(product, field, fields[field])
+            self.menu_query.update(product)
+            touched.add(restaurant.id)
+
+        for id_ in touched:
+            self.render_cache.invalidate_menu(id_)
+            if id_ in by_id:
+                self.search_index.update(by_id[id_])
 
     def login(self):
         print("\nВход в систему")
         username = input("Логин: ")
         password = input("Пароль: ")
 
-        user = self.excel.verify_user(username, password)
+        user = self.storage.verify_user(username, password)
         if user:
             self.current_user = user
             print(f"\nДобро пожаловать, {username}!")
@@ -239,10 +2974,7 @@ class RestaurantManager:
         while True:
             phone_raw = input("Номер телефона (форматы: 8ХХХХХХХХХХ, +7ХХХХХХХХХХ): ")
             try:
-                restaurant = Restaurant(None, name_raw, phone_raw, address_raw)
-                restaurant = self.excel.save_restaurant(restaurant)
-                restaurant.menu = []
-                self.restaurants.append(restaurant)
+                self.add_restaurant(name_raw, phone_raw, address_raw)
                 print("Ресторан успешно добавлен!")
                 return
             except ValueError as e:
@@ -253,22 +2985,27 @@ class RestaurantManager:
         while True:
             price = input("Введите цену блюда: ")
             try:
-                product = Product(None, restaurant.id, name, float(price))
-                product = self.excel.save_product(product)
-                restaurant.menu.append(product)
+                self.add_product(restaurant, name, price)
                 print("Блюдо успешно добавлено!")
                 return
             except ValueError:
                 print("Цена должна быть числом. Попробуйте еще раз.")
 
+    def print_pages(self, lines, total):
+        # Печатает пронумерованный список постранично по PAGE_SIZE строк
+        for i, line in enumerate(lines, 1):
+            print(f"{i}. {line}")
+            if i % PAGE_SIZE == 0 and i < total:
+                answer = input(f"Показано {i} из {total}. Enter — следующая страница, q — закончить: ")
+                if answer.strip().lower() == "q":
+                    break
+
     def select_restaurant(self, prompt="Выберите ресторан: "):
         if not self.restaurants:
             print("Нет доступных ресторанов")
             return None
 
-        print("\nСписок ресторанов:")
-        for i, r in enumerate(self.restaurants, 1):
-            print(f"{i}. {r.name} - {r.address}")
+        self.show_all_restaurants()
 
         try:
             choice = int(input(prompt)) - 1
@@ -286,8 +3023,7 @@ class RestaurantManager:
             print("Нет доступных ресторанов")
         else:
             print("\nСписок ресторанов:")
-            for i, restaurant in enumerate(self.restaurants, 1):
-                print(f"{i}. {restaurant.name} - {restaurant.address}")
+            self.print_pages(self.render_listing(), len(self.restaurants))
 
     def show_restaurant_details(self):
         if not self.restaurants:
@@ -298,7 +3034,7 @@ class RestaurantManager:
         try:
             choice = int(input("Введите номер ресторана для просмотра: ")) - 1
             if 0 <= choice < len(self.restaurants):
-                print("\n" + str(self.restaurants[choice]))
+                print("\n" + self.render_restaurant(self.restaurants[choice]))
                 self.show_menu(self.restaurants[choice])
             else:
                 print("Неверный номер ресторана")
@@ -306,15 +3042,14 @@ class RestaurantManager:
             print("Введите число!")
 
     def search_restaurant(self):
-        query = input("Введите часть названия или адреса для поиска: ").lower()
-        found = [r for r in self.restaurants if query in r.name.lower() or query in r.address.lower()]
+        query = input("Введите часть названия, адреса или блюда для поиска: ")
+        found = self.search_index.search(query)
 
         if not found:
             print("Ничего не найдено")
         else:
             print("\nРезультаты поиска:")
-            for i, restaurant in enumerate(found, 1):
-                print(f"{i}. {restaurant.name} - {restaurant.address}")
+            self.print_pages((f"{r.name} - {r.address}" for r in found), len(found))
 
     def show_menu(self, restaurant):
         if not restaurant.menu:
@@ -322,8 +3057,7 @@ class RestaurantManager:
             return False
         else:
             print(f"\nМеню ресторана '{restaurant.name}':")
-            for i, product in enumerate(restaurant.menu, 1):
-                print(f"{i}. {product}")
+            self.print_pages(self.render_menu(restaurant), len(restaurant.menu))
             return True
 
     def select_product(self, restaurant, prompt="Выберите блюдо: "):
@@ -347,7 +3081,7 @@ class RestaurantManager:
             return
 
         print("\nТекущая информация:")
-        print(restaurant)
+        print(self.render_restaurant(restaurant))
 
         print("\nЧто вы хотите изменить?")
         print("1. Название")
@@ -360,29 +3094,25 @@ class RestaurantManager:
 
         if choice == "1":
             new_name = input("Введите новое название: ")
-            restaurant.update_info(new_name=new_name)
-            self.excel.save_restaurant(restaurant)
+            self.update_restaurant(restaurant, name=new_name)
             print("Название успешно изменено!")
         elif choice == "2":
             while True:
                 new_phone = input("Введите новый телефон: ")
                 try:
-                    restaurant.update_info(new_phone=new_phone)
-                    self.excel.save_restaurant(restaurant)
+                    self.update_restaurant(restaurant, phone=new_phone)
                     print("Телефон успешно изменён!")
                     break
                 except ValueError as e:
                     print(f"Ошибка: {e}")
         elif choice == "3":
             new_address = input("Введите новый адрес: ")
-            restaurant.update_info(new_address=new_address)
-            self.excel.save_restaurant(restaurant)
+            self.update_restaurant(restaurant, address=new_address)
             print("Адрес успешно изменён!")
         elif choice == "4":
             confirm = input(f"Вы уверены, что хотите удалить ресторан '{restaurant.name}'? (да/нет): ")
             if confirm.lower() == 'да':
-                self.excel.delete_restaurant(restaurant.id)
-                self.restaurants.remove(restaurant)
+                self.remove_restaurant(restaurant)
                 print("Ресторан успешно удалён!")
         elif choice == "5":
             return
@@ -395,6 +3125,13 @@ class RestaurantManager:
             return
 
         while True:
+            self.refresh()
+            # После перечитывания данных объект ресторана мог смениться
+            restaurant = next((r for r in self.restaurants if r.id == restaurant.id), None)
+            if restaurant is None:
+                print("Ресторан был удалён другим пользователем")
+                return
+
             print("\nРедактирование меню:")
             if not self.show_menu(restaurant):
                 print("1. Добавить блюдо")
@@ -413,7 +3150,8 @@ class RestaurantManager:
                 print("2. Изменить блюдо")
                 print("3. Удалить блюдо")
                 print("4. Изменить статус блюда")
-                print("5. Вернуться назад")
+                print("5. Изменить все цены на процент")
+                print("6. Вернуться назад")
 
                 choice = input("Выберите действие: ")
 
@@ -425,10 +3163,8 @@ class RestaurantManager:
                         new_name = input(f"Введите новое название (текущее: {product.name}): ") or product.name
                         new_price = input(f"Введите новую цену (текущая: {product.price}): ") or product.price
 
-                        product.update_name(new_name)
                         try:
-                            product.update_price(new_price)
-                            self.excel.save_product(product)
+                            self.update_product(restaurant, product, new_name, new_price)
                             print("Блюдо успешно изменено!")
                         except ValueError:
                             print("Цена должна быть числом. Изменения не сохранены.")
@@ -437,22 +3173,159 @@ class RestaurantManager:
                     if product:
                         confirm = input(f"Вы уверены, что хотите удалить блюдо '{product.name}'? (да/нет): ")
                         if confirm.lower() == 'да':
-                            self.excel.delete_product(product.id)
-                            restaurant.menu.remove(product)
+                            self.remove_product(restaurant, product)
                             print("Блюдо успешно удалено!")
                 elif choice == "4":
                     product = self.select_product(restaurant, "Выберите блюдо для изменения статуса: ")
                     if product:
-                        new_status = product.change_status()
-                        self.excel.save_product(product)
+                        new_status = self.toggle_product_status(restaurant, product)
                         print(f"Статус изменён на {'доступен' if new_status else 'не доступен'}")
                 elif choice == "5":
+                    try:
+                        percent = float(input("На сколько процентов изменить цены (например, 10 или -5): "))
+                    except ValueError:
+                        print("Процент должен быть числом!")
+                        continue
+                    try:
+                        changed = self.scale_prices(restaurant, percent)
+                    except ValueError as e:
+                        print(f"Ошибка: {e}")
+                        continue
+                    print(f"Цены изменены у блюд: {changed}")
+                elif choice == "6":
                     return
                 else:
                     print("Неверный ввод")
 
+    def save_changes(self):
+        if self.storage.has_unsaved_changes:
+            self.storage.flush()
+            print("Изменения сохранены в файл")
+        else:
+            print("Нет несохранённых изменений")
+
+    def menu_analytics(self):
+        while True:
+            print("\nАналитика меню:")
+            print("1. Блюда в диапазоне цен")
+            print("2. Недоступные блюда")
+            print("3. Самое дешёвое доступное блюдо в каждом ресторане")
+            print("4. Сводка цен по ресторанам")
+            print("5. Доступные блюда не дороже заданной цены")
+            print("6. Назад")
+
+            choice = input("Выберите действие: ")
+            names = {restaurant.id: restaurant.name for restaurant in self.restaurants}
+
+            if choice == "1":
+                try:
+                    min_price = input("Цена от (Enter — без ограничения): ").strip()
+                    max_price = input("Цена до (Enter — без ограничения): ").strip()
+                    found = self.menu_query.price_range(float(min_price) if min_price else None,
+                                                        float(max_price) if max_price else None)
+                except ValueError:
+                    print("Цена должна быть числом!")
+                    continue
+                if not found:
+                    print("Ничего не найдено")
+                else:
+                    self.print_pages((f"{names.get(p.restaurant_id)}: {p}" for p in found), len(found))
+            elif choice == "2":
+                found = self.menu_query.with_status(available=False)
+                if not found:
+                    print("Все блюда доступны")
+                else:
+                    self.print_pages((f"{names.get(p.restaurant_id)}: {p}" for p in found), len(found))
+            elif choice == "3":
+                cheapest = self.menu_query.cheapest()
+                lines = [f"{names[rid]}: {p}" for rid, p in cheapest.items() if rid in names]
+                if not lines:
+                    print("Нет доступных блюд")
+                else:
+                    self.print_pages(lines, len(lines))
+            elif choice == "4":
+                aggregates = self.menu_query.aggregates()
+                lines = [f"{names[rid]}: блюд {a['count']}, доступно {a['available']}, "
+                         f"цена {a['min']}–{a['max']}₽, в среднем {a['mean']}₽"
+                         for rid, a in aggregates.items() if rid in names]
+                if not lines:
+                    print("Меню пустые")
+                else:
+                    self.print_pages(lines, len(lines))
+            elif choice == "5":
+                try:
+                    found = self.menu_query.available_under(float(input("Цена до: ")))
+                except ValueError:
+                    print("Цена должна быть числом!")
+                    continue
+                if not found:
+                    print("Ничего не найдено")
+                else:
+                    self.print_pages((f"{names.get(p.restaurant_id)}: {p}" for p in found), len(found))
+            elif choice == "6":
+                return
+            else:
+                print("Неверный ввод")
+
+    def history_menu(self):
+        while True:
+            print("\nИстория изменений:")
+            print("1. Отменить последнее действие")
+            print("2. Повторить отменённое действие")
+            print("3. Показать историю")
+            print("4. Откатить к записи или моменту времени")
+            print("5. Назад")
+
+            choice = input("Выберите действие: ")
+
+            if choice == "1":
+                entry, conflicts = self.undo()
+                print(f"Отменено: {entry['label']}" if entry else "Нечего отменять")
+                if conflicts:
+                    print(f"Пропущено строк, изменённых после записи: {conflicts}")
+            elif choice == "2":
+                entry, conflicts = self.redo()
+                print(f"Повторено: {entry['label']}" if entry else "Нечего повторять")
+                if conflicts:
+                    print(f"Пропущено строк, изменённых после записи: {conflicts}")
+            elif choice == "3":
+                entries = self.history.recent()
+                if not entries:
+                    print("История пуста")
+                for entry in entries:
+                    moment = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["time"]))
+                    print(f"{entry['seq']}. {moment} {entry['label']}")
+            elif choice == "4":
+                target = input("Номер записи или время (ГГГГ-ММ-ДД ЧЧ:ММ): ").strip()
+                try:
+                    moment = None if target.isdigit() else time.strptime(target, "%Y-%m-%d %H:%M")
+                except ValueError:
+                    print("Введите номер записи или время в формате ГГГГ-ММ-ДД ЧЧ:ММ")
+                    continue
+                try:
+                    seq = int(target) if moment is None else self.history.seq_at(time.mktime(moment))
+                    changed, conflicts = self.rollback(seq)
+                except ValueError as e:
+                    print(f"Ошибка: {e}")
+                    continue
+                print(f"Откат выполнен, изменено строк: {changed}" if changed else "Состояние уже совпадает")
+                if conflicts:
+                    print(f"Пропущено строк, изменённых после записи: {conflicts}")
+            elif choice == "5":
+                return
+            else:
+                print("Неверный ввод")
+
+    def show_stats(self):
+        print("\nСамые затратные операции хранилища:")
+        print(METRICS.report())
+        stats = self.render_cache.stats()
+        print(f"\nКэш отрисовки: попаданий {stats['hits']}, промахов {stats['misses']}, "
+              f"записей {stats['size']} из {stats['maxsize']}")
+
     def main_menu(self):
         while True:
+            self.refresh()
             print("\nГлавное меню:")
             print("1. Добавить ресторан")
             print("2. Редактировать ресторан")
@@ -460,7 +3333,11 @@ class RestaurantManager:
             print("4. Просмотреть все рестораны")
             print("5. Просмотреть детали ресторана")
             print("6. Поиск ресторана")
-            print("7. Выход")
+            print("7. Сохранить изменения")
+            print("8. Аналитика меню")
+            print("9. История изменений")
+            print("10. Статистика")
+            print("11. Выход")
 
             choice = input("Выберите действие: ")
 
@@ -477,14 +3354,486 @@ class RestaurantManager:
             elif choice == "6":
                 self.search_restaurant()
             elif choice == "7":
+                self.save_changes()
+            elif choice == "8":
+                self.menu_analytics()
+            elif choice == "9":
+                self.history_menu()
+            elif choice == "10":
+                self.show_stats()
+            elif choice == "11":
+                self.storage.close()
                 print("Выход из программы")
                 break
             else:
                 print("Неверный ввод, попробуйте еще раз")
 
 
-def main():
-    manager = RestaurantManager()
+class StorageWriter:
+    # Выделенный поток для блокирующих операций хранилища. Задания, накопившиеся
+    # в очереди, пока поток был занят, выполняются одной групповой фиксацией
+    # (storage.batch()), так что при нагрузке один fsync приходится на много записей
+    def __init__(self, storage):
+        self.storage = storage
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, function, *args):
+        future = concurrent.futures.Future()
+        self.queue.put((future, function, args))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            jobs = [self.queue.get()]
+            while True:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in jobs
+            jobs = [job for job in jobs if job is not None]
+
+            results = []
+            try:
+                with self.storage.batch():
+                    for future, function, args in jobs:
+                        try:
+                            results.append((future, function(*args), None))
+                        except Exception as error:
+                            results.append((future, None, error))
+            except Exception as error:
+                # Не удалось зафиксировать пакет: ошибку получают все его задания
+                results = [(future, None, error) for future, _function, _args in jobs]
+
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+            if stop:
+                return
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RestaurantService:
+    # HTTP/JSON-сервис поверх общей модели RestaurantManager. Чтения обслуживаются
+    # из памяти в цикле событий, записи в хранилище уходят в поток StorageWriter,
+    # а модель меняется только в цикле событий после успешной записи
+    REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 500: "Internal Server Error"}
+
+    def __init__(self, manager, refresh_interval=SERVICE_REFRESH_INTERVAL):
+        self.manager = manager
+        self.storage = manager.storage
+        self.writer = StorageWriter(self.storage)
+        self.refresh_interval = refresh_interval
+        self.routes = [
+            ("GET", r"/restaurants", self.list_restaurants),
+            ("GET", r"/restaurants/search", self.search_restaurants),
+            ("GET", r"/restaurants/(\d+)", self.get_restaurant),
+            ("GET", r"/restaurants/(\d+)/menu", self.get_menu),
+            ("GET", r"/products", self.query_products),
+            ("GET", r"/stats/menu", self.menu_stats),
+            ("GET", r"/stats/cache", self.cache_stats),
+            ("GET", r"/stats/operations", self.operation_stats),
+            ("POST", r"/restaurants", self.create_restaurant),
+            ("PATCH", r"/restaurants/(\d+)", self.update_restaurant),
+            ("DELETE", r"/restaurants/(\d+)", self.delete_restaurant),
+            ("POST", r"/restaurants/(\d+)/menu", self.create_product),
+            ("PATCH", r"/products/(\d+)", self.update_product),
+            ("DELETE", r"/products/(\d+)", self.delete_product),
+        ]
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in self.routes]
+        self._reindex()
+
+    def _reindex(self):
+        self.restaurants = {restaurant.id: restaurant for restaurant in self.manager.restaurants}
+        self.products = {product.id: (restaurant, product)
+                         for restaurant in self.manager.restaurants for product in restaurant.menu}
+
+    async def _write(self, function, *args):
+        return await asyncio.wrap_future(self.writer.submit(function, *args))
+
+    def _write_recorded(self, function, args, entry):
+        # Задание потока записи: изменение хранилища и запись истории. История берёт
+        # блокировку файла и время от времени пишет снимок, поэтому в цикле событий
+        # не выполняется. entry() возвращает (подпись, изменения) и вызывается после
+        # записи, когда ID уже назначены
+        result = function(*args)
+        label, changes = entry()
+        self.manager.history.record(label, changes, lambda: _model_state(self.storage.load_restaurants_with_menus()))
+        return result
+
+    def _restaurant(self, restaurant_id):
+        restaurant = self.restaurants.get(int(restaurant_id))
+        if restaurant is None:
+            raise ServiceError(404, "Ресторан не найден")
+        return restaurant
+
+    def _product(self, product_id):
+        found = self.products.get(int(product_id))
+        if found is None:
+            raise ServiceError(404, "Блюдо не найдено")
+        return found
+
+    @staticmethod
+    def _page(items, query):
+        try:
+            offset = int(query.get("offset", 0))
+            limit = int(query.get("limit", PAGE_SIZE))
+        except ValueError:
+            raise ServiceError(400, "offset и limit должны быть числами")
+        return {"total": len(items), "items": items[offset:offset + limit]}
+
+    @staticmethod
+    def _text(data, field, required=False):
+        # Строковое поле тела запроса; None — поля нет и оно необязательно
+        value = data.get(field)
+        if value is None and not required:
+            return None
+        if not isinstance(value, str) or not value.strip():
+            raise ServiceError(400, f"Поле {field} должно быть непустой строкой")
+        return value.strip()
+
+    @staticmethod
+    def _flag(data, field, default):
+        value = data.get(field, default)
+        if not isinstance(value, bool):
+            raise ServiceError(400, f"Поле {field} должно быть true или false")
+        return value
+
+    # Чтения: только из памяти
+
+    async def list_restaurants(self, query, data):
+        return 200, self._page(self.manager.render_listing("json"), query)
+
+    async def search_restaurants(self, query, data):
+        found = self.manager.search_index.search(query.get("q", ""))
+        return 200, self._page([self.manager.render_restaurant(r, "json") for r in found], query)
+
+    async def get_restaurant(self, query, data, restaurant_id):
+        restaurant = self._restaurant(restaurant_id)
+        return 200, dict(self.manager.render_restaurant(restaurant, "json"),
+                         menu=self.manager.render_menu(restaurant, "json"))
+
+    async def get_menu(self, query, data, restaurant_id):
+        return 200, self._page(self.manager.render_menu(self._restaurant(restaurant_id), "json"), query)
+
+    async def query_products(self, query, data):
+        # Фильтр блюд: min_price, max_price, available (1/0), restaurant_id
+        try:
+            min_price = float(query["min_price"]) if "min_price" in query else None
+            max_price = float(query["max_price"]) if "max_price" in query else None
+            restaurant_id = int(query["restaurant_id"]) if "restaurant_id" in query else None
+        except ValueError:
+            raise ServiceError(400, "min_price, max_price и restaurant_id должны быть числами")
+        available = query["available"] not in ("0", "false") if "available" in query else None
+        found = self.manager.menu_query.price_range(min_price, max_price, available, restaurant_id)
+        return 200, self._page([_product_json(product) for product in found], query)
+
+    async def menu_stats(self, query, data):
+        return 200, [dict(stats, restaurant_id=rid) for rid, stats in self.manager.menu_query.aggregates().items()]
+
+    async def cache_stats(self, query, data):
+        return 200, self.manager.render_cache.stats()
+
+    async def operation_stats(self, query, data):
+        return 200, [dict(stats, name=name) for name, stats in METRICS.hottest(int(query.get("limit", 20)))]
+
+    # Записи: сначала хранилище (в потоке записи), затем модель
+
+    async def create_restaurant(self, query, data):
+        restaurant = Restaurant(None, self._text(data, "name", True), data.get("phone", ""),
+                                self._text(data, "address", True))
+        await self._write(self._write_recorded, self.storage.save_restaurant, (restaurant,),
+                          lambda: (f"Добавлен ресторан '{restaurant.name}'",
+                                   [[SHEET_RESTAURANTS, restaurant.id, None, _restaurant_row(restaurant)]]))
+        self.manager.restaurants.append(restaurant)
+        self.manager.search_index.add(restaurant)
+        self.manager.render_cache.invalidate_restaurant(restaurant.id)
+        self.restaurants[restaurant.id] = restaurant
+        return 201, _restaurant_json(restaurant)
+
+    async def update_restaurant(self, query, data, restaurant_id):
+        restaurant = self._restaurant(restaurant_id)
+        # Новые значения проверяются и сохраняются на копии, чтобы при ошибке модель не менялась
+        updated = Restaurant(restaurant.id, restaurant.name, restaurant.phone, restaurant.address)
+        updated.update_info(new_name=self._text(data, "name"), new_phone=data.get("phone"),
+                            new_address=self._text(data, "address"))
+        fields = [field for field in ("name", "phone", "address") if data.get(field)]
+        before, after = _restaurant_row(restaurant), _restaurant_row(updated)
+        await self._write(self._write_recorded, self.storage.save_restaurant, (updated, fields),
+                          lambda: (f"Изменён ресторан '{updated.name}'",
+                                   [[SHEET_RESTAURANTS, updated.id, before, after]] if fields else []))
+        for field in fields:
+            setattr(restaurant, field, getattr(updated, field))
+        self.manager.search_index.update(restaurant)
+        self.manager.render_cache.invalidate_restaurant(restaurant.id)
+        return 200, _restaurant_json(restaurant)
+
+    async def delete_restaurant(self, query, data, restaurant_id):
+        restaurant = self._restaurant(restaurant_id)
+        # Вместе с рестораном в запись попадают все его блюда, чтобы отмена вернула и их
+        changes = ([[SHEET_RESTAURANTS, restaurant.id, _restaurant_row(restaurant), None]]
+                   + [[SHEET_MENU, product.id, _product_row(product), None] for product in restaurant.menu])
+        await self._write(self._write_recorded, self.storage.delete_restaurant, (restaurant.id,),
+                          lambda: (f"Удалён ресторан '{restaurant.name}' ({len(changes) - 1} блюд)", changes))
+        if self.restaurants.pop(restaurant.id, None) is not None:
+            self.manager.restaurants.remove(restaurant)
+            self.manager.search_index.remove(restaurant.id)
+            self.manager.menu_query.remove_restaurant(restaurant.id)
+            self.manager.render_cache.invalidate_restaurant(restaurant.id)
+            self.manager.render_cache.invalidate_menu(restaurant.id)
+            for product in restaurant.menu:
+                self.products.pop(product.id, None)
+        return 200, {"deleted": restaurant.id}
+
+    async def create_product(self, query, data, restaurant_id):
+        restaurant = self._restaurant(restaurant_id)
+        product = Product(None, restaurant.id, self._text(data, "name", True), data.get("price"),
+                          self._flag(data, "status", True))
+        await self._write(self._write_recorded, self.storage.save_product, (product,),
+                          lambda: (f"Добавлено блюдо '{product.name}'",
+                                   [[SHEET_MENU, product.id, None, _product_row(product)]]))
+        restaurant.menu.append(product)
+        self.manager.search_index.update(restaurant)
+        self.manager.menu_query.add(product)
+        self.manager.render_cache.invalidate_menu(restaurant.id)
+        self.products[product.id] = (restaurant, product)
+        return 201, _product_json(product)
+
+    async def update_product(self, query, data, product_id):
+        restaurant, product = self._product(product_id)
+        updated = Product(product.id, product.restaurant_id, self._text(data, "name") or product.name,
+                          data.get("price", product.price), self._flag(data, "status", product.status))
+        fields = [field for field in ("name", "price", "status") if field in data]
+        before, after = _product_row(product), _product_row(updated)
+        await self._write(self._write_recorded, self.storage.save_product, (updated, fields),
+                          lambda: (f"Изменено блюдо '{updated.name}'",
+                                   [[SHEET_MENU, updated.id, before, after]] if fields else []))
+        for field in fields:
+            setattr(product, field, getattr(updated, field))
+        self.manager.search_index.update(restaurant)
+        self.manager.menu_query.update(product)
+        self.manager.render_cache.invalidate_menu(restaurant.id)
+        return 200, _product_json(product)
+
+    async def delete_product(self, query, data, product_id):
+        restaurant, product = self._product(product_id)
+        before = _product_row(product)
+        await self._write(self._write_recorded, self.storage.delete_product, (product.id,),
+                          lambda: (f"Удалено блюдо '{product.name}'", [[SHEET_MENU, product.id, before, None]]))
+        if self.products.pop(product.id, None) is not None:
+            restaurant.menu.remove(product)
+            self.manager.search_index.update(restaurant)
+            self.manager.menu_query.remove(product.id)
+            self.manager.render_cache.invalidate_menu(restaurant.id)
+        return 200, {"deleted": product.id}
+
+    async def _refresh_loop(self):
+        # Изменения других процессов подтягиваются в общую модель: проверка идёт
+        # в потоке записи, применение — в цикле событий
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            changes = await self._write(self.storage.refresh)
+            if changes.reload:
+                self.manager.set_restaurants(await self._write(self.storage.load_restaurants_with_menus))
+            elif changes:
+                self.manager.apply_changes(changes)
+            else:
+                continue
+            self._reindex()
+
+    async def dispatch(self, method, target, body):
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        path = url.path.rstrip("/") or "/"
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if not match:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            try:
+                data = json.loads(body) if body else {}
+                if not isinstance(data, dict):
+                    raise ServiceError(400, "Тело запроса должно быть JSON-объектом")
+                return await handler(query, data, *match.groups())
+            except ServiceError as error:
+                return error.status, {"error": str(error)}
+            except (ValueError, TypeError) as error:
+                return 400, {"error": str(error)}
+        if allowed:
+            return 405, {"error": "Метод не поддерживается"}
+        return 404, {"error": "Не найдено"}
+
+    async def handle_connection(self, reader, writer):
+        # Минимальный HTTP/1.1: запросы с Content-Length и keep-alive
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except Exception as error:
+                    status, payload = 500, {"error": str(error)}
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write((f"HTTP/1.1 {status} {self.REASONS[status]}\r\n"
+                              f"Content-Type: application/json; charset=utf-8\r\n"
+                              f"Content-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        refresher = asyncio.create_task(self._refresh_loop())
+        stopped = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+        except NotImplementedError:  # На Windows обработчиков сигналов в цикле событий нет
+            pass
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"Сервис запущен на http://{host}:{port}", flush=True)
+        try:
+            async with server:
+                await stopped.wait()
+        finally:
+            refresher.cancel()
+
+    def close(self):
+        self.writer.close()
+        self.storage.close()
+
+
+def create_storage(args):
+    if args.backend == "sqlite":
+        return SQLiteManager(args.db)
+    return ExcelManager(args.xlsx, session=True, autosave_interval=AUTOSAVE_INTERVAL, parse_workers=args.workers)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Управление ресторанами и меню")
+    parser.add_argument("--backend", choices=["excel", "sqlite"], default="excel",
+                        help="хранилище данных (по умолчанию excel)")
+    parser.add_argument("--xlsx", default=EXCEL_FILE, help="файл книги Excel")
+    parser.add_argument("--db", default=DB_FILE, help="файл базы SQLite")
+    parser.add_argument("--profile", choices=["cpu", "memory"],
+                        help=f"профилировать запуск: cpu (cProfile) или memory (tracemalloc); также {PROFILE_ENV}")
+    parser.add_argument("--profile-output", help="куда сохранить профиль (.prof или снимок tracemalloc)")
+    parser.add_argument("--stats", action="store_true", help="при выходе напечатать самые затратные операции")
+    parser.add_argument("--workers", type=int, help="сколько процессов использовать для разбора и выгрузки книги")
+
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("import-xlsx", help="перенести данные из книги Excel в базу SQLite")
+    commands.add_parser("export-xlsx", help="выгрузить базу SQLite в книгу Excel")
+    bulk = commands.add_parser("bulk-import", help="массово добавить рестораны и блюда из CSV/JSON/XLSX")
+    bulk.add_argument("files", nargs="+", help="файлы с ресторанами и/или блюдами")
+    bulk.add_argument("--dry-run", action="store_true", help="только проверить, ничего не сохраняя")
+    commands.add_parser("parse-xlsx", help="разобрать книгу параллельно и обновить снимок для быстрого запуска")
+    shards = commands.add_parser("export-shards", help="выгрузить меню ресторанов частями в CSV/JSON/XLSX")
+    shards.add_argument("directory", help="каталог для частей выгрузки")
+    shards.add_argument("--format", choices=["csv", "json", "xlsx"], default="csv", help="формат частей")
+    shards.add_argument("--shards", type=int, help="число частей (по умолчанию по числу процессов)")
+    serve = commands.add_parser("serve", help="запустить HTTP/JSON-сервис")
+    serve.add_argument("--host", default="127.0.0.1", help="адрес (по умолчанию 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8080, help="порт (по умолчанию 8080)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mode = args.profile or os.environ.get(PROFILE_ENV)
+    profiler = Profiler(mode, args.profile_output).start() if mode else None
+    try:
+        run_command(args)
+    finally:
+        if profiler:
+            profiler.stop()
+        if args.stats:
+            print("\nСтатистика операций хранилища:")
+            print(METRICS.report())
+
+
+def run_command(args):
+    if args.command == "import-xlsx":
+        counts = import_xlsx_to_sqlite(args.xlsx, args.db)
+        print(f"Импортировано в {args.db}: " + ", ".join(f"{sheet} — {n}" for sheet, n in counts.items()))
+        return
+    if args.command == "export-xlsx":
+        counts = export_sqlite_to_xlsx(args.db, args.xlsx)
+        print(f"Выгружено в {args.xlsx}: " + ", ".join(f"{sheet} — {n}" for sheet, n in counts.items()))
+        return
+    if args.command == "bulk-import":
+        storage = create_storage(args)
+        try:
+            result = bulk_import(storage, args.files, args.dry_run, History.for_storage(storage))
+        finally:
+            storage.close()
+        action = "Проверено" if args.dry_run else "Добавлено"
+        print(f"{action} ресторанов: {len(result.restaurants)}, блюд: {len(result.products)}")
+        if result.rejected:
+            print(f"Отклонено строк: {len(result.rejected)}")
+            for source, number, reason in result.rejected:
+                print(f"  {source}, строка {number}: {reason}")
+        return
+    if args.command == "parse-xlsx":
+        storage = ExcelManager(args.xlsx, parse_workers=args.workers or os.cpu_count() or 1)
+        start = time.perf_counter()
+        sheets = storage.load_sheets(refresh=True)
+        print(f"Разобрано за {time.perf_counter() - start:.2f} с: "
+              + ", ".join(f"{sheet} — {len(rows)}" for sheet, rows in sheets.items()))
+        return
+    if args.command == "export-shards":
+        storage = create_storage(args)
+        try:
+            paths = export_shards(storage, args.directory, args.format, args.shards, args.workers)
+        finally:
+            storage.close()
+        print(f"Записано файлов: {len(paths)} в {args.directory}")
+        return
+    if args.command == "serve":
+        service = RestaurantService(RestaurantManager(create_storage(args)))
+        try:
+            asyncio.run(service.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+        return
+
+    manager = RestaurantManager(create_storage(args))
 
     # Авторизация
     while not manager.current_user:
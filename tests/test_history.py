@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+
+from main import ExcelManager, History, Restaurant, RestaurantManager, bulk_import
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.tmp.name, "restaurant_data.xlsx")
+        self.manager = RestaurantManager(ExcelManager(self.file, session=True))
+        # Второй процесс, который пишет в ту же книгу
+        self.other = ExcelManager(self.file, session=True)
+
+    def tearDown(self):
+        self.other.close()
+        self.manager.storage.close()
+        self.tmp.cleanup()
+
+    def names(self):
+        self.manager.refresh()
+        return sorted(restaurant.name for restaurant in self.manager.restaurants)
+
+    def test_rollback_keeps_rows_written_outside_history(self):
+        self.manager.add_restaurant("Сад", "89991234567", "ул. Ленина, 1")
+        self.other.save_restaurant(Restaurant(None, "Вне истории", "89991234567", "ул. Мира, 2"))
+        self.manager.add_restaurant("Дом", "89991234567", "ул. Мира, 3")
+
+        self.assertEqual(self.manager.rollback(2), (0, 0))
+        self.assertEqual(self.manager.rollback(1), (1, 0))
+        self.assertEqual(self.names(), ["Вне истории", "Сад"])
+
+    def test_undo_skips_row_changed_by_other_process(self):
+        restaurant = self.manager.add_restaurant("Сад", "89991234567", "ул. Ленина, 1")
+        changed = Restaurant(restaurant.id, "Сад у реки", restaurant.phone, restaurant.address)
+        self.other.save_restaurant(changed, ["name"])
+
+        entry, conflicts = self.manager.undo()
+        self.assertEqual((entry["seq"], conflicts), (1, 1))
+        self.assertEqual(self.names(), ["Сад у реки"])
+
+    def test_undo_delete_keeps_menu_order(self):
+        restaurant = self.manager.add_restaurant("Сад", "89991234567", "ул. Ленина, 1")
+        for i in range(3):
+            self.manager.add_product(restaurant, f"Блюдо {i}", 100 + i)
+        self.manager.remove_restaurant(restaurant)
+
+        self.assertEqual(self.manager.undo()[1], 0)
+        restored = self.manager.restaurants[0]
+        self.assertEqual([p.name for p in restored.menu], ["Блюдо 0", "Блюдо 1", "Блюдо 2"])
+        self.assertEqual([p.name for p in self.other.get_products_for_restaurant(restored.id)],
+                         ["Блюдо 0", "Блюдо 1", "Блюдо 2"])
+
+    def test_bulk_import_is_recorded(self):
+        self.manager.add_restaurant("Сад", "89991234567", "ул. Ленина, 1")
+        source = os.path.join(self.tmp.name, "import.json")
+        with open(source, "w", encoding="utf-8") as f:
+            json.dump({"restaurants": [{"ID": "a", "Название": "Импорт", "Телефон": "89991234567",
+                                        "Адрес": "ул. Мира, 2"}],
+                       "products": [{"ID_ресторана": "a", "Название": "Борщ", "Цена": 100}]}, f)
+        bulk_import(self.other, [source], history=History.for_storage(self.other))
+
+        self.assertEqual(self.manager.rollback(1), (2, 0))
+        self.assertEqual(self.names(), ["Сад"])
+
+
+if __name__ == "__main__":
+    unittest.main()
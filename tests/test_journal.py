@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+import openpyxl
+
+from main import SHEET_RESTAURANTS, ExcelManager, Restaurant
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.tmp.name, "restaurant_data.xlsx")
+        ExcelManager(self.file).save_restaurant(Restaurant(None, "Сад", "89991234567", "ул. Ленина, 1"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def names(self, storage=None):
+        return [restaurant.name for restaurant in (storage or ExcelManager(self.file)).get_restaurants()]
+
+    def workbook_names(self):
+        wb = openpyxl.load_workbook(self.file, read_only=True)
+        try:
+            return [row[1] for row in wb[SHEET_RESTAURANTS].iter_rows(min_row=2, values_only=True)]
+        finally:
+            wb.close()
+
+    def crash_after_writes(self, *names):
+        # Процесс пишет в режиме сессии и завершается без flush() и close()
+        code = textwrap.dedent(f"""
+            import os, sys
+            sys.path.insert(0, {ROOT!r})
+            from main import ExcelManager, Restaurant
+            storage = ExcelManager({self.file!r}, session=True)
+            for name in {list(names)!r}:
+                storage.save_restaurant(Restaurant(None, name, "89991234567", "ул. Мира, 2"))
+            os._exit(0)
+        """)
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_writes_are_replayed_after_crash(self):
+        self.crash_after_writes("Дом", "Двор")
+        self.assertEqual(self.workbook_names(), ["Сад"])
+
+        self.assertEqual(self.names(), ["Сад", "Дом", "Двор"])
+        # При запуске журнал сжат в книгу
+        self.assertEqual(self.workbook_names(), ["Сад", "Дом", "Двор"])
+
+    def test_torn_last_line_is_ignored(self):
+        self.crash_after_writes("Дом")
+        with open(self.file + ".journal", "ab") as journal:
+            journal.write(b'[["put", "\xd0\xa0\xd0\xb5\xd1\x81\xd1\x82')
+
+        storage = ExcelManager(self.file, session=True)
+        self.assertEqual(self.names(storage), ["Сад", "Дом"])
+        storage.save_restaurant(Restaurant(None, "Двор", "89991234567", "ул. Мира, 3"))
+        storage.close()
+        self.assertEqual(self.workbook_names(), ["Сад", "Дом", "Двор"])
+
+    def test_reader_catches_up_from_previous_journal(self):
+        writer = ExcelManager(self.file, session=True)
+        reader = ExcelManager(self.file, session=True)
+        reader.get_restaurants()
+        writer.save_restaurant(Restaurant(None, "Дом", "89991234567", "ул. Мира, 2"))
+        # Сжатие переносит журнал в .prev до того, как reader его прочитал
+        writer.flush()
+        self.assertTrue(os.path.exists(self.file + ".journal.prev"))
+
+        changes = reader.refresh()
+        self.assertFalse(changes.reload)
+        self.assertEqual([row["name"] for row in changes.rows[SHEET_RESTAURANTS].values()], ["Дом"])
+        self.assertEqual(self.names(reader), ["Сад", "Дом"])
+        writer.close()
+        reader.close()
+
+    def test_reader_reloads_after_two_compactions(self):
+        writer = ExcelManager(self.file, session=True)
+        reader = ExcelManager(self.file, session=True)
+        reader.get_restaurants()
+        for name in ("Дом", "Двор"):
+            writer.save_restaurant(Restaurant(None, name, "89991234567", "ул. Мира, 2"))
+            writer.flush()
+
+        self.assertTrue(reader.refresh().reload)
+        self.assertEqual(self.names(reader), ["Сад", "Дом", "Двор"])
+        writer.close()
+        reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
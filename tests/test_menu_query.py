@@ -0,0 +1,86 @@
+import random
+import unittest
+from unittest import mock
+
+import main
+from main import MenuQuery, Product, Restaurant
+
+
+def _restaurants(seed=1, count=20, dishes=300):
+    rnd = random.Random(seed)
+    restaurants = [Restaurant(i, f"Ресторан {i}", "89991234567", f"ул. {i}") for i in range(1, count + 1)]
+    for i in range(1, dishes + 1):
+        restaurant = rnd.choice(restaurants)
+        restaurant.menu.append(Product(i, restaurant.id, f"Блюдо {i}", rnd.randint(100, 900), rnd.random() < 0.8))
+    return restaurants
+
+
+class MenuQueryTest(unittest.TestCase):
+    def assert_matches_rebuild(self, query, restaurants):
+        # Индекс, поддерживаемый по изменениям, совпадает с построенным заново и с полным перебором
+        fresh = MenuQuery(restaurants)
+        products = [product for restaurant in restaurants for product in restaurant.menu]
+        self.assertEqual({rid: dict(a, mean=round(a["mean"], 1)) for rid, a in query.aggregates().items()},
+                         {rid: dict(a, mean=round(a["mean"], 1)) for rid, a in fresh.aggregates().items()})
+        self.assertEqual([p.id for p in query.with_status(False)], sorted(p.id for p in products if not p.status))
+        self.assertEqual([(p.price, p.id) for p in query.price_range(300, 500, True)],
+                         sorted((p.price, p.id) for p in products if 300 <= p.price <= 500 and p.status))
+        self.assertEqual({rid: p.id for rid, p in query.cheapest().items()},
+                         {rid: p.id for rid, p in fresh.cheapest().items()})
+
+    def test_incremental_updates(self):
+        restaurants = _restaurants()
+        query = MenuQuery(restaurants)
+        rnd = random.Random(2)
+        next_id = 10000
+        for _ in range(500):
+            restaurant = rnd.choice(restaurants)
+            action = rnd.random()
+            if action < 0.3 or not restaurant.menu:
+                next_id += 1
+                product = Product(next_id, restaurant.id, "Новое", rnd.randint(100, 900))
+                restaurant.menu.append(product)
+                query.add(product)
+            elif action < 0.5:
+                product = rnd.choice(restaurant.menu)
+                product.update_price(rnd.randint(100, 900))
+                query.update(product)
+            elif action < 0.8:
+                product = rnd.choice(restaurant.menu)
+                product.change_status()
+                query.update(product)
+            elif action < 0.99 or len(restaurants) < 10:
+                product = rnd.choice(restaurant.menu)
+                restaurant.menu.remove(product)
+                query.remove(product.id)
+            else:
+                restaurants.remove(restaurant)
+                query.remove_restaurant(restaurant.id)
+        self.assert_matches_rebuild(query, restaurants)
+
+    def test_scale_prices_and_available_under(self):
+        restaurants = _restaurants()
+        query = MenuQuery(restaurants)
+        restaurant = restaurants[0]
+        expected = {product.id: round(product.price * 1.1, 2) for product in restaurant.menu}
+        changed = query.scale_prices(restaurant.id, 1.1)
+        self.assertEqual({product.id: product.price for product in changed}, expected)
+        self.assertEqual({product.id: product.price for product in restaurant.menu}, expected)
+        self.assert_matches_rebuild(query, restaurants)
+
+        products = [product for restaurant in restaurants for product in restaurant.menu]
+        self.assertEqual([(p.price, p.id) for p in query.available_under(400)],
+                         sorted((p.price, p.id) for p in products if p.price <= 400 and p.status))
+
+    def test_without_numpy(self):
+        with mock.patch.object(main, "_numpy", lambda: None):
+            self.test_incremental_updates()
+            self.test_scale_prices_and_available_under()
+
+    def test_aggregates_of_empty_restaurant(self):
+        self.assertEqual(MenuQuery().aggregates(1),
+                         {"count": 0, "available": 0, "min": None, "max": None, "mean": None})
+
+
+if __name__ == "__main__":
+    unittest.main()
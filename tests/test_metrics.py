@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from main import METRICS, ExcelManager, PasswordHasher, Product, Restaurant
+
+
+class StorageMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = ExcelManager(os.path.join(self.tmp.name, "restaurant_data.xlsx"), session=True,
+                                    hasher=PasswordHasher(cost=1000))
+        restaurant = Restaurant(None, "Сад", "89991234567", "ул. Ленина, 1")
+        restaurant.menu = [Product(None, None, f"Блюдо {i}", 100 + i) for i in range(5)]
+        self.storage.save_many([restaurant])
+        self.restaurant = restaurant
+        METRICS.reset()
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def rows(self, name):
+        return METRICS.operations[name]["rows"]
+
+    def test_rows_of_non_generator_operations(self):
+        self.storage.save_restaurant(self.restaurant, ["name"])
+        self.assertEqual(self.rows("ExcelManager.save_restaurant"), 1)
+
+        # Удаление второго из пяти блюд сдвигает строки с него до конца листа
+        self.storage.delete_product(self.restaurant.menu[1].id)
+        self.assertEqual(self.rows("ExcelManager.delete_product"), 4)
+
+        self.storage.verify_user("admin", "admin")
+        self.assertGreaterEqual(self.rows("ExcelManager.verify_user"), 1)
+
+        self.storage.load_restaurants_with_menus()
+        # Пользователь, ресторан и четыре оставшихся блюда
+        self.assertEqual(self.rows("ExcelManager.load_restaurants_with_menus"), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import re
+import tempfile
+import unittest
+import zipfile
+
+from main import TABLES, ExcelManager, Product, Restaurant, _sheet_paths, parse_sheets_parallel
+
+
+class ParallelParseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.tmp.name, "restaurant_data.xlsx")
+        storage = ExcelManager(self.file)
+        for i in range(1, 6):
+            restaurant = Restaurant(None, f"Ресторан <{i}> & Ко", "89991234567", f"ул. {i}")
+            restaurant.menu = [Product(None, None, f"Блюдо {i}.{j}", 100 + j * 0.5, j % 2 == 0) for j in range(4)]
+            storage.save_many([restaurant])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def openpyxl_rows(self):
+        storage = ExcelManager(self.file)
+        return {sheet: [row for row in storage._iter_rows(sheet) if any(value is not None for value in row)]
+                for sheet in TABLES}
+
+    def rewrite_sheets(self, change):
+        # Переписывает XML листов в архиве функцией change
+        with zipfile.ZipFile(self.file) as archive:
+            sheets = set(_sheet_paths(archive).values())
+            items = [(info, archive.read(info)) for info in archive.infolist()]
+        with zipfile.ZipFile(self.file, "w", zipfile.ZIP_DEFLATED) as archive:
+            for info, data in items:
+                archive.writestr(info, change(data) if info.filename in sheets else data)
+
+    def test_matches_openpyxl(self):
+        self.assertEqual(parse_sheets_parallel(self.file, tuple(TABLES), 1), self.openpyxl_rows())
+
+    def test_matches_openpyxl_after_patch(self):
+        # Сжатие журнала в режиме сессии переписывает изменённые листы сам (inlineStr)
+        storage = ExcelManager(self.file, session=True)
+        restaurant = storage.get_restaurants()[0]
+        restaurant.name = "Новое <имя> & \"кавычки\""
+        storage.save_restaurant(restaurant, ["name"])
+        storage.save_product(Product(None, restaurant.id, "Новое блюдо", 99.9, False))
+        storage.delete_product(2)
+        storage.close()
+
+        sheets = parse_sheets_parallel(self.file, tuple(TABLES), 1)
+        self.assertEqual(sheets, self.openpyxl_rows())
+        self.assertIn("Новое <имя> & \"кавычки\"", [row[1] for row in sheets["Рестораны"]])
+
+    def test_prefixed_namespace_falls_back_to_openpyxl(self):
+        def prefix(xml):
+            xml = re.sub(rb"<(/?)(?![?\w]+:)(\w+)", rb"<\1x:\2", xml)
+            return xml.replace(b' xmlns="', b' xmlns:x="', 1)
+        self.rewrite_sheets(prefix)
+        expected = self.openpyxl_rows()
+        self.assertTrue(expected["Рестораны"])
+
+        with self.assertRaises(ValueError):
+            parse_sheets_parallel(self.file, tuple(TABLES), 1)
+        storage = ExcelManager(self.file, parse_workers=1)
+        self.assertEqual(storage.load_sheets(refresh=True), expected)
+        # Снимок записан из результата openpyxl, а не из пустого разбора
+        self.assertEqual(ExcelManager(self.file).load_sheets(), expected)
+
+    def test_cell_without_reference_falls_back_to_openpyxl(self):
+        self.rewrite_sheets(lambda xml: re.sub(rb'(<c[^>]*?) r="[A-Z]+\d+"', rb"\1", xml))
+        expected = self.openpyxl_rows()
+
+        with self.assertRaises(ValueError):
+            parse_sheets_parallel(self.file, tuple(TABLES), 1)
+        self.assertEqual(ExcelManager(self.file, parse_workers=1).load_sheets(refresh=True), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from main import PasswordHasher, SQLiteManager
+
+
+class PasswordTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = SQLiteManager(os.path.join(self.tmp.name, "restaurants.db"), PasswordHasher(cost=1000))
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def set_password(self, stored):
+        with self.storage.conn:
+            self.storage.conn.execute("UPDATE users SET password = ? WHERE login = 'admin'", (stored,))
+
+    def stored_password(self):
+        return self.storage.conn.execute("SELECT password FROM users WHERE login = 'admin'").fetchone()[0]
+
+    def test_legacy_sha256_is_rehashed_on_login(self):
+        self.set_password(hashlib.sha256(b"admin").hexdigest())
+        self.assertIsNone(self.storage.verify_user("admin", "wrong"))
+        self.assertEqual(self.storage.verify_user("admin", "admin"), {"id": 1, "role": "admin"})
+        self.assertTrue(self.stored_password().startswith("pbkdf2_sha256$1000$"))
+        self.assertEqual(self.storage.verify_user("admin", "admin"), {"id": 1, "role": "admin"})
+
+    def test_cost_change_is_rehashed_on_login(self):
+        self.storage.hasher = PasswordHasher(cost=2000)
+        self.assertTrue(self.stored_password().startswith("pbkdf2_sha256$1000$"))
+        self.assertIsNotNone(self.storage.verify_user("admin", "admin"))
+        self.assertTrue(self.stored_password().startswith("pbkdf2_sha256$2000$"))
+
+    def test_malformed_hash_is_a_failed_login(self):
+        for stored in ("a$b", "pbkdf2_sha256$много$00$00", "pbkdf2_sha256$1000$не-hex$00", "md5$1$00$00",
+                       "scrypt$16384$00$00"):
+            self.set_password(stored)
+            self.assertIsNone(self.storage.verify_user("admin", "admin"), stored)
+
+    def test_unknown_login_runs_dummy_check(self):
+        hasher = self.storage.hasher
+        self.storage.verify_user("nobody", "admin")  # Первый вызов ещё и создаёт фиктивный хэш
+        with mock.patch.object(hasher, "_derive", wraps=hasher._derive) as derive:
+            self.assertIsNone(self.storage.verify_user("nobody", "admin"))
+        self.assertEqual(derive.call_count, 1)
+
+    def test_cache_skips_kdf_and_evicts_oldest(self):
+        hasher = PasswordHasher(cost=1000, cache_size=2)
+        stored = [hasher.hash(f"пароль {i}") for i in range(3)]
+        self.assertEqual(list(hasher._cache), stored[1:])
+
+        with mock.patch.object(hasher, "_derive", wraps=hasher._derive) as derive:
+            self.assertTrue(hasher.verify("пароль 2", stored[2]))
+            self.assertFalse(hasher.verify("не тот", stored[2]))
+            self.assertEqual(derive.call_count, 1)
+            self.assertTrue(hasher.verify("пароль 0", stored[0]))
+            self.assertEqual(derive.call_count, 2)
+        self.assertEqual(list(hasher._cache), [stored[2], stored[0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from main import ExcelManager, RestaurantManager, RestaurantService
+
+
+class RestaurantServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        storage = ExcelManager(os.path.join(self.tmp.name, "restaurant_data.xlsx"), session=True)
+        self.service = RestaurantService(RestaurantManager(storage))
+
+    def tearDown(self):
+        self.service.writer.close()
+        self.service.storage.close()
+        self.tmp.cleanup()
+
+    def request(self, method, target, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        return asyncio.run(self.service.dispatch(method, target, data))
+
+    def create_restaurant(self):
+        status, restaurant = self.request("POST", "/restaurants",
+                                          {"name": "Сад", "phone": "89991234567", "address": "ул. Ленина, 1"})
+        self.assertEqual(status, 201)
+        return restaurant
+
+    def test_restaurant_requires_name_and_address(self):
+        for body in ({"phone": "89991234567", "address": "ул. Ленина, 1"},
+                     {"name": "Сад", "phone": "89991234567"},
+                     {"name": 5, "phone": "89991234567", "address": "ул. Ленина, 1"}):
+            self.assertEqual(self.request("POST", "/restaurants", body)[0], 400)
+        self.assertEqual(self.request("GET", "/restaurants")[1]["total"], 0)
+
+    def test_product_requires_name_and_boolean_status(self):
+        restaurant = self.create_restaurant()
+        menu = f"/restaurants/{restaurant['id']}/menu"
+        self.assertEqual(self.request("POST", menu, {"price": 100})[0], 400)
+        self.assertEqual(self.request("POST", menu, {"name": "Борщ", "price": 100, "status": "false"})[0], 400)
+        status, product = self.request("POST", menu, {"name": "Борщ", "price": 100})
+        self.assertEqual(status, 201)
+        self.assertEqual(self.request("PATCH", f"/products/{product['id']}", {"status": "false"})[0], 400)
+        status, product = self.request("PATCH", f"/products/{product['id']}", {"status": False})
+        self.assertEqual((status, product["status"]), (200, False))
+
+    def test_writes_are_recorded_in_history(self):
+        restaurant = self.create_restaurant()
+        self.request("PATCH", f"/restaurants/{restaurant['id']}", {"name": "Сад у реки"})
+        self.request("DELETE", f"/restaurants/{restaurant['id']}")
+        labels = [entry["label"] for entry in self.service.manager.history.recent()]
+        self.assertEqual(labels, ["Добавлен ресторан 'Сад'", "Изменён ресторан 'Сад у реки'",
+                                  "Удалён ресторан 'Сад у реки' (0 блюд)"])
+
+    def test_search_after_rejected_create(self):
+        self.create_restaurant()
+        self.request("POST", "/restaurants", {"phone": "89991234567"})
+        status, found = self.request("GET", "/restaurants/search?q=сад")
+        self.assertEqual((status, found["total"]), (200, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
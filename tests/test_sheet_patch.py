@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+import zipfile
+
+import openpyxl
+from openpyxl.styles import Font, PatternFill
+
+from main import (METRICS, SHEET_MENU, SHEET_RESTAURANTS, SHEET_USERS, ExcelManager, Product, Restaurant,
+                  _sheet_paths)
+
+
+class SheetPatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.tmp.name, "restaurant_data.xlsx")
+        storage = ExcelManager(self.file)
+        restaurants = []
+        for i in range(1, 4):
+            restaurant = Restaurant(None, f"Ресторан {i}", "89991234567", f"ул. {i}")
+            restaurant.menu = [Product(None, None, f"Блюдо {i}.{j}", 100 + j, True) for j in range(3)]
+            restaurants.append(restaurant)
+        storage.save_many(restaurants)
+        # Оформление, которое сжатие журнала должно сохранить
+        wb = openpyxl.load_workbook(self.file)
+        ws = wb[SHEET_RESTAURANTS]
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+        ws["B2"].fill = PatternFill("solid", start_color="FFFF00")
+        wb.save(self.file)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def parts(self):
+        with zipfile.ZipFile(self.file) as archive:
+            paths = _sheet_paths(archive)
+            return {sheet: archive.read(path) for sheet, path in paths.items()}
+
+    def assert_reopens(self, expected):
+        for read_only in (False, True):
+            wb = openpyxl.load_workbook(self.file, read_only=read_only)
+            try:
+                for sheet, rows in expected.items():
+                    self.assertEqual(list(wb[sheet].iter_rows(min_row=2, values_only=True)), rows)
+                ws = wb[SHEET_RESTAURANTS]
+                self.assertTrue(all(cell.font.bold for cell in next(ws.iter_rows(max_row=1))))
+                self.assertEqual(ws["B2"].fill.start_color.rgb, "00FFFF00")
+                self.assertFalse(ws["B3"].font.bold)
+            finally:
+                wb.close()
+
+    def test_session_edit_patches_only_changed_sheets(self):
+        before = self.parts()
+        storage = ExcelManager(self.file, session=True)
+        restaurant = storage.get_restaurants()[0]
+        restaurant.name = "<Ресторан> & \"кавычки\" 'и' пробел "
+        storage.save_restaurant(restaurant, ["name"])
+        storage.save_restaurant(Restaurant(None, "Новый", "89991234567", "ул. Новая"))
+        storage.flush()
+        storage.close()
+
+        after = self.parts()
+        self.assertEqual(after[SHEET_USERS], before[SHEET_USERS])
+        self.assertEqual(after[SHEET_MENU], before[SHEET_MENU])
+        self.assertNotEqual(after[SHEET_RESTAURANTS], before[SHEET_RESTAURANTS])
+        self.assertIn(b'<dimension ref="A1:D5" />', after[SHEET_RESTAURANTS])
+
+        expected = {SHEET_RESTAURANTS: [(1, "<Ресторан> & \"кавычки\" 'и' пробел ", "89991234567", "ул. 1"),
+                                        (2, "Ресторан 2", "89991234567", "ул. 2"),
+                                        (3, "Ресторан 3", "89991234567", "ул. 3"),
+                                        (4, "Новый", "89991234567", "ул. Новая")],
+                    SHEET_MENU: [(i * 3 + j + 1, i + 1, f"Блюдо {i + 1}.{j}", 100 + j, True)
+                                 for i in range(3) for j in range(3)]}
+        self.assert_reopens(expected)
+
+    def test_delete_shrinks_dimension(self):
+        storage = ExcelManager(self.file, session=True)
+        storage.delete_product(9)
+        storage.delete_product(8)
+        storage.close()
+
+        self.assertIn(b'<dimension ref="A1:E8" />', self.parts()[SHEET_MENU])
+        wb = openpyxl.load_workbook(self.file, read_only=True)
+        self.assertEqual(wb[SHEET_MENU].max_row, 8)
+        wb.close()
+
+    def test_new_style_falls_back_to_full_save(self):
+        # Стиля, которого нет в styles.xml книги, патч не запишет: книга сохраняется целиком
+        wb = openpyxl.load_workbook(self.file)
+        wb[SHEET_RESTAURANTS]["C3"].font = Font(italic=True)
+        METRICS.reset()
+        ExcelManager(self.file)._write_atomic(wb, [SHEET_RESTAURANTS])
+        self.assertIn("openpyxl.save", METRICS.operations)
+
+        wb = openpyxl.load_workbook(self.file)
+        self.assertTrue(wb[SHEET_RESTAURANTS]["C3"].font.italic)
+        self.assertEqual(wb[SHEET_RESTAURANTS]["C3"].value, "89991234567")
+
+
+if __name__ == "__main__":
+    unittest.main()
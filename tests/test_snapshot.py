@@ -0,0 +1,78 @@
+import marshal
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+import openpyxl
+
+from main import SHEET_RESTAURANTS, ExcelManager, Restaurant
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.tmp.name, "restaurant_data.xlsx")
+        ExcelManager(self.file).save_restaurant(Restaurant(None, "Сад", "89991234567", "ул. Ленина, 1"))
+        # Первый запуск разбирает книгу и пишет снимок
+        ExcelManager(self.file).load_restaurants_with_menus()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def names(self):
+        return [restaurant.name for restaurant in ExcelManager(self.file).load_restaurants_with_menus()]
+
+    def tamper_snapshot(self, name):
+        # Подменяет данные снимка, оставляя ключ: по имени видно, откуда прочитаны листы
+        with open(self.file + ".snapshot", "rb") as f:
+            snapshot = marshal.load(f)
+        snapshot["sheets"][SHEET_RESTAURANTS][0] = (1, name, "89991234567", "ул. Ленина, 1")
+        with open(self.file + ".snapshot", "wb") as f:
+            marshal.dump(snapshot, f)
+
+    def test_snapshot_is_used_while_workbook_is_unchanged(self):
+        self.tamper_snapshot("Из снимка")
+        self.assertEqual(self.names(), ["Из снимка"])
+
+    def test_snapshot_is_rejected_when_workbook_changes(self):
+        self.tamper_snapshot("Из снимка")
+        wb = openpyxl.load_workbook(self.file)
+        wb[SHEET_RESTAURANTS]["B2"] = "Сад у реки"
+        wb.save(self.file)
+
+        self.assertIsNone(ExcelManager(self.file)._read_snapshot())
+        self.assertEqual(self.names(), ["Сад у реки"])
+        # Новый снимок записан под новый ключ
+        self.assertIsNotNone(ExcelManager(self.file)._read_snapshot())
+
+    def test_snapshot_is_bypassed_while_journal_is_pending(self):
+        self.tamper_snapshot("Из снимка")
+        storage = ExcelManager(self.file, session=True)
+        storage.save_restaurant(Restaurant(None, "Дом", "89991234567", "ул. Мира, 2"))
+        try:
+            self.assertIsNone(ExcelManager(self.file)._read_snapshot())
+            self.assertEqual(self.names(), ["Сад", "Дом"])
+        finally:
+            storage.close()
+
+    def test_warm_start_does_not_import_openpyxl(self):
+        code = textwrap.dedent(f"""
+            import sys
+            sys.path.insert(0, {ROOT!r})
+            from main import ExcelManager
+            storage = ExcelManager({self.file!r})
+            assert [r.name for r in storage.load_restaurants_with_menus()] == ["Сад"]
+            assert storage.verify_user("admin", "admin")
+            print("openpyxl" in sys.modules)
+        """)
+        result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
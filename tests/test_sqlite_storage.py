@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+
+from main import Restaurant, RestaurantManager, SQLiteManager
+
+
+class SQLiteManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = SQLiteManager(os.path.join(self.tmp.name, "restaurants.db"))
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def test_save_without_changed_fields_is_noop(self):
+        restaurant = self.storage.save_restaurant(Restaurant(None, "Сад", "89991234567", "ул. Ленина, 1"))
+        self.storage.save_restaurant(restaurant, [])
+        self.assertEqual([r.name for r in self.storage.get_restaurants()], ["Сад"])
+
+    def test_update_restaurant_with_empty_input(self):
+        # В консоли пустой ввод нового названия не меняет ресторан
+        manager = RestaurantManager(self.storage)
+        restaurant = manager.add_restaurant("Сад", "89991234567", "ул. Ленина, 1")
+        manager.update_restaurant(restaurant, name="")
+        self.assertEqual([(r.id, r.name) for r in self.storage.get_restaurants()], [(restaurant.id, "Сад")])
+
+
+if __name__ == "__main__":
+    unittest.main()